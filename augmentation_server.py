@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+from augmentation_service import AugmentationService
+from query_manager import QueryManager, ResponseCache
+from query_scheduler import QueryScheduler, TokenBucket
+from feedback_augmented_search import DEFAULT_QUERY_MANAGER_CONFIG
+
+if __name__ == '__main__':
+    # expecting the user to run the command:
+    # python3 augmentation_server.py <API_KEY> <SEARCH_ENGINE_ID> [--port 8080]
+    parser = argparse.ArgumentParser(description="HTTP/JSON service for feedback-augmented search sessions")
+    parser.add_argument('api_key')
+    parser.add_argument('engine_id')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=4,
+                        help="threads running augmentation, shared by all sessions")
+    parser.add_argument('--max-sessions', type=int, default=100,
+                        help="least recently used sessions are evicted beyond this")
+    parser.add_argument('--idle-timeout', type=float, default=30 * 60,
+                        help="seconds after which an idle session is evicted")
+    parser.add_argument('--target-precision', type=float, default=0.9,
+                        help="default target precision of new sessions")
+    parser.add_argument('--session-index', action='store_true',
+                        help="rank candidate words on every result judged in the session")
+    parser.add_argument('--cache', dest='cache_path', default=None,
+                        help="SQLite file to cache search responses in")
+    parser.add_argument('--cache-mode', choices=ResponseCache.MODES, default='read_through')
+    parser.add_argument('--scheduler', dest='scheduler_path', default=None,
+                        help="SQLite file with the API rate limit and daily quota shared by all processes")
+    parser.add_argument('--rate', type=float, default=100 / 60,
+                        help="API requests per second allowed by the scheduler")
+    parser.add_argument('--daily-quota', type=int, default=10000,
+                        help="API requests per day allowed by the scheduler")
+    parser.add_argument('--duplicate-threshold', type=float, default=None,
+                        help="collapse results whose title and snippet are at least this similar (0-1)")
+    parser.add_argument('--backfill', action='store_true',
+                        help="with --duplicate-threshold, top up collapsed results from the next page")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.cache_path, mode=args.cache_mode) if args.cache_path is not None else None
+    scheduler = None
+    if args.scheduler_path is not None:
+        scheduler = QueryScheduler(TokenBucket(args.scheduler_path, rate=args.rate, daily_quota=args.daily_quota))
+    qm = QueryManager(args.api_key, args.engine_id, cache=cache, scheduler=scheduler,
+                      duplicate_threshold=args.duplicate_threshold, backfill=args.backfill,
+                      **DEFAULT_QUERY_MANAGER_CONFIG)
+    service = AugmentationService(qm, workers=args.workers, max_sessions=args.max_sessions,
+                                  idle_timeout=args.idle_timeout, target_precision=args.target_precision,
+                                  session_index=args.session_index)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(service.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        qm.close()
+        if cache is not None:
+            cache.close()
@@ -0,0 +1,2 @@
+from .service import AugmentationService
+from .session_store import Session, SessionStore, SessionNotFoundError
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from query_augmenter import QueryAugmenter, augment_many
+from query_augmenter.parse_cache import ParseCache
+from query_augmenter.stop_words import STOP_WORDS
+from query_augmenter.tokenized_document import DocumentStore
+from query_augmenter.word_vectors import WordVectors
+from query_manager import QueryError
+from .session_store import SessionNotFoundError, SessionStore
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AugmentationService:
+    '''
+    Long-running local HTTP/JSON service running feedback-augmented search sessions for
+    many users. All sessions share one spaCy model, parse cache and document store, so a
+    session only costs its augmenter and its current results. Augmentation runs on a
+    bounded thread pool, and searches go through QueryManager.aquery on the event loop.
+    Sessions waiting for augmentation at the same time are augmented together with
+    augment_many (up to max_batch_size per batch), one batch per worker.
+
+    Endpoints:
+    - POST /sessions {"query", "target_precision"}: starts a session and returns the first results
+    - POST /sessions/<id>/feedback {"feedback": [0 or 1 per result]}: judges the current
+      results. Unless the session is done, the next round is prepared in the background
+    - GET /sessions/<id>/next: waits for the next round and returns its query and results
+    - GET /sessions/<id>: state of the session
+    - DELETE /sessions/<id>: ends the session
+    - GET /stats
+    '''
+    MAX_BODY_SIZE = 1 << 20
+
+    def __init__(self, qm, nlp=None, workers=4, max_sessions=100, idle_timeout=30 * 60,
+                 target_precision=0.9, session_index=False, clock=time.monotonic, max_batch_size=16):
+        self.qm = qm
+        self.model_name = "en_core_web_md"
+        self.nlp = nlp
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        # (session, feedback, future) waiting for augmentation, and the tasks batching them
+        self.augmentation_queue = None
+        self.batch_tasks = []
+        self.batches = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='augmentation')
+        self.sessions = SessionStore(max_sessions, idle_timeout, clock)
+        self.target_precision = target_precision
+        self.session_index = session_index
+        # shared by the augmenters of all the sessions, all are thread safe
+        self.parse_cache = None
+        self.word_vectors = None
+        self.document_store = DocumentStore(STOP_WORDS)
+        self.server = None
+        self.eviction_task = None
+        self.requests = 0
+
+    def __repr__(self) -> str:
+        return f'AugmentationService(workers={self.workers}, sessions={self.sessions})'
+
+    def load_model(self):
+        if self.nlp is None:
+            import spacy
+            self.nlp = spacy.load(self.model_name)
+        self.parse_cache = ParseCache(self.nlp)
+        self.word_vectors = WordVectors(self.nlp.vocab)
+
+    def new_augmenter(self):
+        qa = QueryAugmenter(nlp=self.nlp, session_index=self.session_index)
+        qa.loaded_parse_cache = self.parse_cache
+        qa.loaded_word_vectors = self.word_vectors
+        qa.document_store = self.document_store
+        qa.tokenizer = self.document_store.tokenizer
+        return qa
+
+    async def start(self, host='127.0.0.1', port=8080):
+        '''
+        Loads the model once and starts listening
+        '''
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.load_model)
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        self.eviction_task = asyncio.create_task(self.evict_idle_sessions())
+        self.augmentation_queue = asyncio.Queue()
+        self.batch_tasks = [asyncio.create_task(self.augment_batches()) for _ in range(self.workers)]
+        return self.server
+
+    async def serve_forever(self, host='127.0.0.1', port=8080):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def close(self):
+        if self.eviction_task is not None:
+            self.eviction_task.cancel()
+        for task in self.batch_tasks:
+            task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for session in list(self.sessions.sessions.values()):
+            self.end_session(session)
+        self.executor.shutdown(wait=False)
+
+    async def evict_idle_sessions(self):
+        # checks a few times per idle_timeout, so sessions are freed soon after expiring
+        while True:
+            await asyncio.sleep(max(self.sessions.idle_timeout / 4, 1.0))
+            for session in self.sessions.evict_idle():
+                self.end_session(session)
+
+    @staticmethod
+    def end_session(session):
+        if session.pending is not None:
+            session.pending.cancel()
+            session.pending = None
+
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        '''
+        Minimal HTTP/1.1 with keep-alive: one JSON request and response at a time
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > self.MAX_BODY_SIZE:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "Request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, urlsplit(target).path, body)
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def write_response(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        headers = [
+            f'HTTP/1.1 {status.value} {status.phrase}',
+            'Content-Type: application/json',
+            f'Content-Length: {len(body)}',
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+
+    async def dispatch(self, method, path, body):
+        '''
+        Returns (HTTPStatus, JSON payload) of a request
+        '''
+        self.requests += 1
+        parts = [part for part in path.split('/') if part]
+        try:
+            try:
+                data = json.loads(body) if body else {}
+            except json.JSONDecodeError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+            if not isinstance(data, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+
+            if parts == ['sessions'] and method == 'POST':
+                return HTTPStatus.CREATED, await self.start_session(data)
+            if parts == ['stats'] and method == 'GET':
+                return HTTPStatus.OK, self.stats()
+            if len(parts) == 2 and parts[0] == 'sessions':
+                if method == 'GET':
+                    return HTTPStatus.OK, self.sessions.get(parts[1]).summary()
+                if method == 'DELETE':
+                    self.end_session(self.sessions.remove(parts[1]))
+                    return HTTPStatus.OK, {'session_id': parts[1], 'ended': True}
+            if len(parts) == 3 and parts[0] == 'sessions':
+                if parts[2] == 'feedback' and method == 'POST':
+                    return HTTPStatus.OK, self.submit_feedback(self.sessions.get(parts[1]), data)
+                if parts[2] == 'next' and method == 'GET':
+                    return HTTPStatus.OK, await self.next_round(self.sessions.get(parts[1]))
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint {method} {path}")
+        except HTTPError as error:
+            return error.status, {'error': str(error)}
+        except SessionNotFoundError as error:
+            return HTTPStatus.NOT_FOUND, {'error': f"Unknown or expired session {error.args[0]}"}
+        except QueryError as error:
+            return HTTPStatus.BAD_GATEWAY, {'error': f"QUERY ERROR: {error}"}
+        except Exception as error:
+            # an unexpected error still gets a response, and the connection stays usable
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(error).__name__}: {error}"}
+
+    # endpoints
+
+    async def start_session(self, data):
+        query = data.get('query')
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "A non-empty query is required")
+        target_precision = data.get('target_precision', self.target_precision)
+        if (isinstance(target_precision, bool) or not isinstance(target_precision, (int, float))
+                or not 0 <= target_precision <= 1):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "target_precision must be a number between 0 and 1")
+
+        results = await self.qm.aquery(query)
+        session, evicted = self.sessions.create(self.new_augmenter(), query, target_precision)
+        for evicted_session in evicted:
+            self.end_session(evicted_session)
+        session.results = results
+        session.round = 1
+        return dict(session.summary(), results=results)
+
+    def submit_feedback(self, session, data):
+        feedback = data.get('feedback')
+        if session.done:
+            raise HTTPError(HTTPStatus.CONFLICT, "The session is done")
+        if session.pending is not None:
+            raise HTTPError(HTTPStatus.CONFLICT, "Feedback was already submitted for this round")
+        if (not isinstance(feedback, list) or len(feedback) != len(session.results)
+                or any(judgment not in (0, 1) for judgment in feedback)):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"feedback must be {len(session.results)} judgments of 0 or 1")
+
+        session.precision = sum(feedback) / len(feedback)
+        # same stopping rule as the terminal version: target reached or nothing relevant to learn from
+        session.done = session.precision >= session.target_precision or session.precision == 0.0
+        if not session.done:
+            session.pending = asyncio.create_task(self.prepare_next_round(session, feedback))
+        return session.summary()
+
+    async def prepare_next_round(self, session, feedback):
+        # augmentation is CPU bound and runs on the bounded pool, the search on the event loop
+        future = asyncio.get_running_loop().create_future()
+        await self.augmentation_queue.put((session, feedback, future))
+        query, update = await future
+        results = await self.qm.aquery(query)
+        return query, update, results
+
+    async def augment_batches(self):
+        '''
+        Takes every session waiting for augmentation (up to max_batch_size) and augments them
+        together on the pool
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.augmentation_queue.get()]
+            while len(batch) < self.max_batch_size and not self.augmentation_queue.empty():
+                batch.append(self.augmentation_queue.get_nowait())
+            # sessions evicted while waiting are not augmented
+            batch = [(session, feedback, future) for session, feedback, future in batch if not future.done()]
+            if not batch:
+                continue
+            self.batches += 1
+            try:
+                outcomes = await loop.run_in_executor(self.executor, augment_many, [
+                    (session.qa, session.query, session.results, feedback) for session, feedback, _ in batch
+                ], True)
+            except Exception as error:
+                outcomes = [error] * len(batch)
+            for (_, _, future), outcome in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    async def next_round(self, session):
+        if session.pending is None:
+            if session.done:
+                raise HTTPError(HTTPStatus.CONFLICT, "The session is done")
+            raise HTTPError(HTTPStatus.CONFLICT, "Submit feedback for the current results first")
+        # taken out first, so that a concurrent request can't apply the same round twice
+        pending, session.pending = session.pending, None
+        try:
+            query, update, results = await pending
+        except ValueError as error:
+            session.done = True
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, f"The query can't be augmented: {error}")
+
+        session.query = query
+        session.appended = list(update) if isinstance(update, tuple) else [update]
+        session.results = results
+        session.precision = None
+        session.round += 1
+        return dict(session.summary(), results=results)
+
+    def stats(self):
+        return {
+            'sessions': len(self.sessions),
+            'evictions': self.sessions.evictions,
+            'requests': self.requests,
+            'augmentation_batches': self.batches,
+            'parse_cache': {'hits': self.parse_cache.hits, 'misses': self.parse_cache.misses}
+            if self.parse_cache is not None else None,
+            'document_store': {'hits': self.document_store.hits, 'misses': self.document_store.misses},
+            'scheduler': self.qm.scheduler.stats() if self.qm.scheduler is not None else None,
+        }
@@ -0,0 +1,110 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class SessionNotFoundError(KeyError):
+    '''
+    The session id is unknown, or the session was evicted
+    '''
+    pass
+
+
+class Session:
+    '''
+    State of one user of the service: their augmenter (k drifts during a session), the
+    current query and results, and the next round while it is being prepared
+    '''
+    def __init__(self, session_id, qa, query, target_precision, last_used):
+        self.id = session_id
+        self.qa = qa
+        self.query = query
+        self.target_precision = target_precision
+        self.results = None
+        self.precision = None
+        self.appended = None
+        self.round = 0
+        self.done = False
+        # asyncio task preparing the next query and results after feedback was submitted
+        self.pending = None
+        self.last_used = last_used
+
+    def __repr__(self) -> str:
+        return f'Session(id={self.id}, query={self.query!r}, round={self.round}, done={self.done})'
+
+    def summary(self):
+        return {
+            'session_id': self.id,
+            'query': self.query,
+            'round': self.round,
+            'precision': self.precision,
+            'appended': self.appended,
+            'done': self.done,
+        }
+
+
+class SessionStore:
+    '''
+    Sessions by id. Sessions idle for longer than idle_timeout seconds are evicted, and the
+    least recently used sessions are evicted beyond max_sessions
+    '''
+    def __init__(self, max_sessions=100, idle_timeout=30 * 60, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.sessions = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'SessionStore(sessions={len(self.sessions)}, max_sessions={self.max_sessions}, idle_timeout={self.idle_timeout})'
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def create(self, qa, query, target_precision):
+        '''
+        Adds a new session and returns it together with the sessions evicted to make room
+        '''
+        session = Session(uuid.uuid4().hex, qa, query, target_precision, self.clock())
+        with self.lock:
+            self.sessions[session.id] = session
+            evicted = self.evict()
+        return session, evicted
+
+    def get(self, session_id):
+        '''
+        Returns the session and marks it as used, raises SessionNotFoundError if it is unknown
+        '''
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or self.is_idle(session):
+                raise SessionNotFoundError(session_id)
+            session.last_used = self.clock()
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        return session
+
+    def is_idle(self, session):
+        return self.clock() - session.last_used > self.idle_timeout
+
+    def evict(self):
+        # idle sessions go first, then the least recently used ones over max_sessions
+        evicted = [session for session in self.sessions.values() if self.is_idle(session)]
+        for session in evicted:
+            del self.sessions[session.id]
+        while len(self.sessions) > self.max_sessions:
+            evicted.append(self.sessions.popitem(last=False)[1])
+        self.evictions += len(evicted)
+        return evicted
+
+    def evict_idle(self):
+        with self.lock:
+            return self.evict()
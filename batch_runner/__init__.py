@@ -0,0 +1,2 @@
+from .batch_runner import BatchRunner, run_session
+from .oracle import RelevanceOracle
\ No newline at end of file
@@ -0,0 +1,121 @@
+import json
+import multiprocessing
+import time
+
+from query_manager import QueryManager, ResponseCache, QueryError
+from query_augmenter import QueryAugmenter
+from query_scheduler import QueryScheduler, TokenBucket, BATCH
+from .oracle import RelevanceOracle
+
+# state of each worker process, set up once by init_worker
+WORKER = {}
+
+
+def run_session(qm, qa, session, max_rounds=10):
+    '''
+    Runs the feedback loop of feedback_augmented_search.run for one session, with the
+    judgments coming from the session's qrels. Returns the trace of the session
+    '''
+    oracle = RelevanceOracle(session['qrels'])
+    target_precision = session['target_precision']
+    current_query = session['query']
+    trace = {'id': session.get('id'), 'initial_query': current_query, 'rounds': []}
+    session_start = time.perf_counter()
+    # terms appended to get the query of the current round
+    appended = None
+    try:
+        for _ in range(max_rounds):
+            round_start = time.perf_counter()
+            results = qm.query(current_query)
+            feedback = oracle.judge(results)
+            precision = sum(feedback) / len(feedback) if feedback else 0.0
+            round_trace = {'query': current_query, 'precision': precision, 'appended': appended}
+            trace['rounds'].append(round_trace)
+            # same stopping rule as run(): target reached or no relevant document to learn from
+            done = precision >= target_precision or precision == 0.0
+            if not done:
+                current_query, update = qa.augment_query(current_query, results, feedback)
+                appended = list(update) if isinstance(update, tuple) else [update]
+            round_trace['seconds'] = time.perf_counter() - round_start
+            if done:
+                break
+    except (QueryError, ValueError) as error:
+        trace['error'] = f'{type(error).__name__}: {error}'
+
+    trace['final_query'] = trace['rounds'][-1]['query'] if trace['rounds'] else current_query
+    trace['reached_target'] = bool(trace['rounds']) and trace['rounds'][-1]['precision'] >= target_precision
+    trace['wall_time'] = time.perf_counter() - session_start
+    return trace
+
+
+def init_worker(api_key, engine_id, query_manager_config, cache_path, cache_mode, scheduler_config):
+    from . import preload
+    cache = ResponseCache(cache_path, mode=cache_mode) if cache_path is not None else None
+    # the bucket file is shared by all the workers (and any other process using it)
+    scheduler = QueryScheduler(TokenBucket(**scheduler_config)) if scheduler_config is not None else None
+    WORKER['qm'] = QueryManager(api_key, engine_id, cache=cache, scheduler=scheduler, priority=BATCH,
+                                **query_manager_config)
+    WORKER['nlp'] = preload.NLP
+
+
+def run_worker_session(args):
+    session, max_rounds, session_index, embedding_weight = args
+    # a fresh augmenter per session (k drifts during a session), sharing the preloaded model
+    qa = QueryAugmenter(nlp=WORKER['nlp'], session_index=session_index, embedding_weight=embedding_weight)
+    return run_session(WORKER['qm'], qa, session, max_rounds)
+
+
+class BatchRunner:
+    '''
+    Runs many non-interactive sessions across a process pool. The pool is started from a
+    forkserver that preloads the spaCy model once (batch_runner.preload).
+    '''
+    def __init__(self, api_key, engine_id, query_manager_config, processes=None,
+                 cache_path=None, cache_mode='read_through', max_rounds=10, session_index=False,
+                 scheduler_config=None, embedding_weight=0.0):
+        self.api_key = api_key
+        self.engine_id = engine_id
+        self.query_manager_config = query_manager_config
+        self.processes = processes
+        self.cache_path = cache_path
+        self.cache_mode = cache_mode
+        self.max_rounds = max_rounds
+        self.session_index = session_index
+        self.embedding_weight = embedding_weight
+        # TokenBucket arguments ({'path', 'rate', 'daily_quota'}) to rate limit all the workers together
+        self.scheduler_config = scheduler_config
+
+    def __repr__(self) -> str:
+        return f'BatchRunner(processes={self.processes}, cache_path={self.cache_path}, cache_mode={self.cache_mode}, max_rounds={self.max_rounds})'
+
+    @staticmethod
+    def read_sessions(sessions_path):
+        '''
+        One session per line: {"id", "query", "target_precision", "qrels": {URL: 0/1}}
+        '''
+        with open(sessions_path, 'r') as sessions_file:
+            return [json.loads(line) for line in sessions_file if line.strip()]
+
+    def context(self):
+        if 'forkserver' not in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('spawn')
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['batch_runner.preload'])
+        return context
+
+    def run(self, sessions_path, traces_path):
+        '''
+        Runs all the sessions in sessions_path and writes one trace per line to traces_path,
+        in the order they finish. Returns the traces
+        '''
+        sessions = self.read_sessions(sessions_path)
+        traces = []
+        initargs = (self.api_key, self.engine_id, self.query_manager_config, self.cache_path, self.cache_mode,
+                    self.scheduler_config)
+        with self.context().Pool(self.processes, initializer=init_worker, initargs=initargs) as pool, \
+                open(traces_path, 'w') as traces_file:
+            tasks = [(session, self.max_rounds, self.session_index, self.embedding_weight) for session in sessions]
+            for trace in pool.imap_unordered(run_worker_session, tasks):
+                traces_file.write(json.dumps(trace) + '\n')
+                traces.append(trace)
+        return traces
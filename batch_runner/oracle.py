@@ -0,0 +1,10 @@
+class RelevanceOracle:
+    '''
+    Judges results from qrels-style relevance labels {URL: 0/1}, in place of the user.
+    URLs that are not in the qrels are judged not relevant.
+    '''
+    def __init__(self, qrels):
+        self.qrels = qrels
+
+    def judge(self, results):
+        return [1 if self.qrels.get(result['URL'], 0) else 0 for result in results]
@@ -0,0 +1,5 @@
+# Imported by the forkserver before any worker is forked, so that every worker shares
+# the loaded model copy-on-write instead of loading its own
+import spacy
+
+NLP = spacy.load("en_core_web_md")
@@ -0,0 +1,49 @@
+import argparse
+from batch_runner import BatchRunner
+from query_manager import ResponseCache
+from feedback_augmented_search import DEFAULT_QUERY_MANAGER_CONFIG
+
+if __name__ == '__main__':
+    # expecting the user to run the command:
+    # python3 batch_search.py <API_KEY> <SEARCH_ENGINE_ID> <SESSIONS_JSONL> <TRACES_JSONL>
+    parser = argparse.ArgumentParser(description="Non-interactive feedback-augmented search sessions")
+    parser.add_argument('api_key')
+    parser.add_argument('engine_id')
+    parser.add_argument('sessions_path', help="JSONL of {id, query, target_precision, qrels}")
+    parser.add_argument('traces_path', help="JSONL file the session traces are written to")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--max-rounds', type=int, default=10)
+    parser.add_argument('--session-index', action='store_true',
+                        help="rank candidate words on every result judged in the session")
+    parser.add_argument('--embedding-weight', type=float, default=0.0,
+                        help="weight of the word vector similarity feature (0 switches it off)")
+    parser.add_argument('--cache', dest='cache_path', default=None,
+                        help="SQLite file to cache search responses in")
+    parser.add_argument('--cache-mode', choices=ResponseCache.MODES, default='read_through')
+    parser.add_argument('--scheduler', dest='scheduler_path', default=None,
+                        help="SQLite file with the API rate limit and daily quota shared by all processes")
+    parser.add_argument('--rate', type=float, default=100 / 60,
+                        help="API requests per second allowed by the scheduler")
+    parser.add_argument('--daily-quota', type=int, default=10000,
+                        help="API requests per day allowed by the scheduler")
+    parser.add_argument('--duplicate-threshold', type=float, default=None,
+                        help="collapse results whose title and snippet are at least this similar (0-1)")
+    parser.add_argument('--backfill', action='store_true',
+                        help="with --duplicate-threshold, top up collapsed results from the next page")
+    args = parser.parse_args()
+
+    scheduler_config = None
+    if args.scheduler_path is not None:
+        scheduler_config = {'path': args.scheduler_path, 'rate': args.rate, 'daily_quota': args.daily_quota}
+
+    query_manager_config = dict(DEFAULT_QUERY_MANAGER_CONFIG, duplicate_threshold=args.duplicate_threshold,
+                                backfill=args.backfill)
+    runner = BatchRunner(args.api_key, args.engine_id, query_manager_config,
+                         processes=args.processes, cache_path=args.cache_path,
+                         cache_mode=args.cache_mode, max_rounds=args.max_rounds,
+                         session_index=args.session_index, scheduler_config=scheduler_config,
+                         embedding_weight=args.embedding_weight)
+    traces = runner.run(args.sessions_path, args.traces_path)
+    reached = sum(trace['reached_target'] for trace in traces)
+    print(f"{len(traces)} sessions, {reached} reached the target precision, traces in {args.traces_path}")
@@ -0,0 +1,106 @@
+import random
+import re
+
+# words for synthetic snippets, a small topical vocabulary mixed with filler words
+TOPIC_WORDS = ('restaurant', 'thomas', 'keller', 'michelin', 'york', 'tasting', 'menu', 'chef',
+               'french', 'laundry', 'columbus', 'circle', 'reservations', 'cuisine', 'dining')
+FILLER_WORDS = tuple(f'word{i}' for i in range(2000))
+
+
+def load_transcript_rounds(path):
+    '''
+    Parses a session transcript (the terminal output of feedback_augmented_search.py) into
+    recorded rounds: [{'query', 'results': [{'URL', 'Title', 'Summary'}], 'feedback'}]
+    '''
+    rounds = []
+    current = None
+    result = None
+    with open(path, 'r') as transcript_file:
+        for line in transcript_file:
+            line = line.rstrip('\n')
+            if line.startswith('Query       = '):
+                current = {'query': line[len('Query       = '):], 'results': [], 'feedback': []}
+                rounds.append(current)
+            elif line.startswith('URL: '):
+                result = {'URL': line[len('URL: '):]}
+            elif line.startswith('Title: '):
+                result['Title'] = line[len('Title: '):]
+            elif line.startswith('Summary: '):
+                result['Summary'] = line[len('Summary: '):]
+                current['results'].append(result)
+            elif line.startswith('Relevant (Y/N)?'):
+                answer = line[len('Relevant (Y/N)?'):].strip().upper()
+                current['feedback'].append(1 if answer == 'Y' else 0)
+    # the last query of a session may not have been judged
+    return [recorded for recorded in rounds if recorded['results']]
+
+
+def as_api_response(results):
+    '''
+    Turns mapped results back into the raw Custom Search response format
+    '''
+    return {'items': [
+        {'link': result['URL'], 'title': result['Title'], 'snippet': result['Summary'],
+         'kind': 'customsearch#result', 'pagemap': {'metatags': [{'og:type': 'website'}]}}
+        for result in results
+    ]}
+
+
+def synthetic_round(n_results=10, snippet_words=25, n_query_terms=2, relevant_ratio=0.4, seed=0):
+    '''
+    A deterministic synthetic round. Relevant results use more topic words than the others
+    so that augmentation has something to find
+    '''
+    rng = random.Random(seed)
+    query_terms = list(TOPIC_WORDS[:n_query_terms])
+    results = []
+    feedback = []
+    for i in range(n_results):
+        relevant = rng.random() < relevant_ratio
+        topic_share = 0.5 if relevant else 0.1
+
+        def text(n_words):
+            return ' '.join(
+                rng.choice(TOPIC_WORDS) if rng.random() < topic_share else rng.choice(FILLER_WORDS)
+                for _ in range(n_words)
+            )
+        results.append({
+            'URL': f'https://example.com/{seed}/{i}',
+            'Title': ' '.join(query_terms) + ' ' + text(6),
+            'Summary': text(snippet_words),
+        })
+        feedback.append(1 if relevant else 0)
+    # augmentation needs at least one relevant result
+    feedback[0] = 1
+    return {'query': ' '.join(query_terms), 'results': results, 'feedback': feedback}
+
+
+def tokenized_relevant_docs(recorded_round):
+    '''
+    Relevant documents (lists of words) as get_new_query passes them to reorder
+    '''
+    return [
+        re.findall(r'\w+', (result['Title'] + ' ' + result['Summary']).lower())
+        for result, judgment in zip(recorded_round['results'], recorded_round['feedback'])
+        if judgment == 1
+    ]
+
+
+class FixtureClient:
+    '''
+    Stands in for AsyncSearchClient and serves a recorded response, so QueryManager can be
+    benchmarked without network access
+    '''
+    PAGE_SIZE = 10
+
+    def __init__(self, response):
+        self.response = response
+
+    def page_starts(self, number_of_results):
+        return list(range(1, number_of_results + 1, self.PAGE_SIZE))
+
+    async def fetch_page(self, query, start=1, num=PAGE_SIZE):
+        return {'items': self.response['items'][start - 1:start - 1 + num]}
+
+    def close(self):
+        pass
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+from instrumentation import Instrumentation
+from query_augmenter import QueryAugmenter, augment_many
+from query_augmenter.term_matrix import TermMatrix
+from query_manager import QueryManager
+from .fixtures import (
+    FixtureClient,
+    as_api_response,
+    load_transcript_rounds,
+    synthetic_round,
+    tokenized_relevant_docs,
+)
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+TRANSCRIPT = os.path.join(REPO_DIR, 'transcipt.txt')
+
+RESULT_COUNTS = (10, 100, 1000)
+SNIPPET_WORDS = (25, 250)
+REORDER_TERMS = range(2, 9)
+# the regex reordering is factorial in the number of terms
+REGEX_REORDER_TERMS = range(2, 7)
+# sessions augmented together by augment_many
+BATCH_SESSIONS = 16
+# weight of the embedding cases, the transcript rounds score words of the real vocab
+EMBEDDING_WEIGHT = 1.0
+
+
+def augment_case(qa, recorded_round, embedding_weight=0.0):
+    '''
+    One cold augment_query call: k and the parse cache are reset every time
+    '''
+    def run():
+        qa.k = 0.6
+        qa.embedding_weight = embedding_weight
+        if qa.loaded_parse_cache is not None:
+            qa.loaded_parse_cache.docs.clear()
+        qa.augment_query(recorded_round['query'], recorded_round['results'], recorded_round['feedback'])
+    # kept for the per-stage breakdown
+    run.recorded_round = recorded_round
+    return run
+
+
+def sessions_case(qa, recorded_rounds, batched):
+    '''
+    One cold augmentation of every round, each with its own augmenter sharing the model and
+    parse cache of qa, with augment_many or one augment_query call at a time
+    '''
+    def run():
+        qa.parse_cache.docs.clear()
+        batch = []
+        for recorded_round in recorded_rounds:
+            augmenter = QueryAugmenter(nlp=qa.nlp)
+            augmenter.loaded_parse_cache = qa.parse_cache
+            batch.append((augmenter, recorded_round['query'], recorded_round['results'], recorded_round['feedback']))
+        if batched:
+            augment_many(batch)
+        else:
+            for augmenter, query, results, feedback in batch:
+                augmenter.augment_query(query, results, feedback)
+    return run
+
+
+def reorder_case(qa, n_terms, mode):
+    recorded_round = synthetic_round(n_results=10, snippet_words=60, n_query_terms=n_terms, seed=n_terms)
+    terms = recorded_round['query'].split()
+    documents = tokenized_relevant_docs(recorded_round)
+
+    def run():
+        qa.reorder_mode = mode
+        qa.reorder(terms, documents)
+    return run
+
+
+def full_cases(qa):
+    '''
+    name -> zero-argument callable, covering QueryManager parsing and augment_query end to end
+    '''
+    cases = {}
+    for n_results in RESULT_COUNTS:
+        response = as_api_response(synthetic_round(n_results=n_results, seed=n_results)['results'])
+        qm = QueryManager('', '', number_of_results=n_results, client=FixtureClient(response))
+        cases[f'query_manager.query/results={n_results}'] = lambda qm=qm: qm.query('benchmark')
+
+    if os.path.exists(TRANSCRIPT):
+        for i, recorded_round in enumerate(load_transcript_rounds(TRANSCRIPT)):
+            if 0 < sum(recorded_round['feedback']) < len(recorded_round['feedback']):
+                cases[f'augment_query/transcript/round={i}'] = augment_case(qa, recorded_round)
+                cases[f'augment_query/embedding/transcript/round={i}'] = augment_case(
+                    qa, recorded_round, EMBEDDING_WEIGHT
+                )
+    for n_results in RESULT_COUNTS:
+        recorded_round = synthetic_round(n_results=n_results, seed=n_results)
+        cases[f'augment_query/results={n_results}'] = augment_case(qa, recorded_round)
+    for snippet_words in SNIPPET_WORDS:
+        recorded_round = synthetic_round(snippet_words=snippet_words, seed=snippet_words)
+        cases[f'augment_query/snippet_words={snippet_words}'] = augment_case(qa, recorded_round)
+
+    recorded_rounds = [synthetic_round(seed=seed) for seed in range(BATCH_SESSIONS)]
+    cases[f'augment_query/sequential/sessions={BATCH_SESSIONS}'] = sessions_case(qa, recorded_rounds, False)
+    cases[f'augment_many/sessions={BATCH_SESSIONS}'] = sessions_case(qa, recorded_rounds, True)
+
+    for n_terms in REORDER_TERMS:
+        cases[f'reorder/fast/terms={n_terms}'] = reorder_case(qa, n_terms, 'fast')
+    for n_terms in REGEX_REORDER_TERMS:
+        cases[f'reorder/regex/terms={n_terms}'] = reorder_case(qa, n_terms, 'regex')
+    return cases
+
+
+def micro_cases(qa):
+    '''
+    The hot functions of the augmenter on their own. None of them needs the spaCy model
+    '''
+    cases = {}
+    for n_results in RESULT_COUNTS:
+        recorded_round = synthetic_round(n_results=n_results, seed=n_results)
+        query_terms = recorded_round['query'].split()
+        feedback = recorded_round['feedback']
+        documents, vocab = qa.extract_words(recorded_round['results'], query_terms)
+        inverse_list = qa.construct_inverse_list(documents, vocab, query_terms)
+
+        cases[f'extract_words/results={n_results}'] = (
+            lambda results=recorded_round['results'], terms=query_terms: qa.extract_words(results, terms)
+        )
+        cases[f'construct_inverse_list/results={n_results}'] = (
+            lambda d=documents, v=vocab, t=query_terms: qa.construct_inverse_list(d, v, t)
+        )
+        cases[f'gini_gain/all_words/results={n_results}'] = (
+            lambda v=vocab, il=inverse_list, f=feedback: [qa.gini_gain(word, il, f) for word in v]
+        )
+        cases[f'term_matrix/gini_gains/results={n_results}'] = (
+            lambda d=documents, v=vocab, t=query_terms, f=feedback: TermMatrix(d, v, t, f).statistics.gini_gains()
+        )
+
+    for n_terms in REORDER_TERMS:
+        recorded_round = synthetic_round(snippet_words=60, n_query_terms=n_terms, seed=n_terms)
+        order = recorded_round['query'].split()
+        documents = [' '.join(words) for words in tokenized_relevant_docs(recorded_round)]
+        cases[f'subsequence_count_of_order/terms={n_terms}'] = (
+            lambda o=order, docs=documents: [qa.subsequence_count_of_order(o, doc) for doc in docs]
+        )
+    return cases
+
+
+def measure(function, repeat):
+    '''
+    Seconds per call (min and median over repeat samples), peak traced memory of one call
+    '''
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    samples = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'min': min(samples), 'median': statistics.median(samples), 'peak_memory_bytes': peak_memory}
+
+
+def stage_timings(qa, case):
+    '''
+    Seconds spent in every augment_query stage for one call of an augment_case
+    '''
+    instrumentation = Instrumentation()
+    previous = qa.instrumentation
+    qa.instrumentation = instrumentation
+    try:
+        case()
+    finally:
+        qa.instrumentation = previous
+    return {name: seconds for name, (_, seconds, _) in instrumentation.stage_totals.items()}
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Cases whose median got slower than the baseline by more than tolerance
+    '''
+    regressions = {}
+    for name, result in results.items():
+        if name in baseline and result['median'] > baseline[name]['median'] * (1.0 + tolerance):
+            regressions[name] = result['median'] / baseline[name]['median']
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of QueryManager and QueryAugmenter")
+    parser.add_argument('--micro', action='store_true', help="run the microbenchmarks instead")
+    parser.add_argument('--filter', default='', help="only run cases whose name contains this")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="pin the results of this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown of the median before a case counts as a regression")
+    parser.add_argument('--output', default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    qa = QueryAugmenter()
+    cases = micro_cases(qa) if args.micro else full_cases(qa)
+    cases = {name: case for name, case in cases.items() if args.filter in name}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {}
+    print(f"{'case':<45}{'median ms':>12}{'min ms':>12}{'peak KiB':>12}{'vs baseline':>13}")
+    for name, case in cases.items():
+        result = measure(case, args.repeat)
+        results[name] = result
+        ratio = f"{result['median'] / baseline[name]['median']:.2f}x" if name in baseline else '-'
+        print(f"{name:<45}{result['median'] * 1000:12.3f}{result['min'] * 1000:12.3f}"
+              f"{result['peak_memory_bytes'] / 1024:12.1f}{ratio:>13}")
+
+    for name, case in cases.items():
+        if hasattr(case, 'recorded_round'):
+            results[name]['stages'] = stage_timings(qa, case)
+            print(f"\nstages of {name}:")
+            for stage, seconds in sorted(results[name]['stages'].items(), key=lambda item: -item[1]):
+                print(f"  {stage:<30}{seconds * 1000:10.3f} ms")
+
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, ratio in regressions.items():
+        print(f"REGRESSION: {name} is {ratio:.2f}x slower than the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,24 @@
+import time
+# import times are recorded for --profile-startup
+STARTUP_PROFILE = {}
+_start = time.perf_counter()
+import argparse
 import sys
-from query_manager import QueryManager
+from query_manager import QueryManager, ResponseCache, QueryError
+STARTUP_PROFILE['import query_manager'] = time.perf_counter() - _start
+_start = time.perf_counter()
 from ui_manager import UIManager
+STARTUP_PROFILE['import ui_manager'] = time.perf_counter() - _start
+_start = time.perf_counter()
 from query_augmenter import QueryAugmenter
-import numpy
+STARTUP_PROFILE['import query_augmenter'] = time.perf_counter() - _start
+_start = time.perf_counter()
+from prefetcher import Prefetcher
+from instrumentation import Instrumentation
+from query_scheduler import QueryScheduler, TokenBucket
+from session_checkpoint import SessionCheckpoint
+from query_explorer import QueryExplorer
+STARTUP_PROFILE['import session modules'] = time.perf_counter() - _start
 
 # we keep the number of results to top 10
 DEFAULT_QUERY_MANAGER_CONFIG ={'number_of_results':10,
@@ -13,46 +29,224 @@ DEFAULT_QUERY_MANAGER_CONFIG ={'number_of_results':10,
                                     'snippet': 'Summary'}}
 
 
-def run(api_key, engine_id, target_precision, INITIAL_QUERY):
+def run(api_key, engine_id, target_precision, INITIAL_QUERY, profile_startup=False,
+        cache_path=None, cache_mode='read_through', pipeline=False, instrumentation=None,
+        session_index=False, scheduler=None, checkpoint_path=None, resume=False,
+        duplicate_threshold=None, backfill=False, explore=0, explore_budget=3.0, embedding_weight=0.0):
+    run_start = time.perf_counter()
+    # responses can be cached on disk, and replayed without network access in 'offline' mode
+    cache = ResponseCache(cache_path, mode=cache_mode) if cache_path is not None else None
     # we make objects of each of our classes
-    qm = QueryManager(api_key, engine_id, **DEFAULT_QUERY_MANAGER_CONFIG)
+    qm = QueryManager(api_key, engine_id, cache=cache, instrumentation=instrumentation,
+                      scheduler=scheduler, duplicate_threshold=duplicate_threshold, backfill=backfill,
+                      **DEFAULT_QUERY_MANAGER_CONFIG)
     um = UIManager(api_key, engine_id, target_precision)
-    qa = QueryAugmenter()
+    qa = QueryAugmenter(instrumentation=instrumentation, session_index=session_index,
+                        embedding_weight=embedding_weight)
+    # the spacy model loads while the first query is sent and the user judges the results
+    qa.load_model_in_background()
+    STARTUP_PROFILE['construct managers'] = time.perf_counter() - run_start
+    # in pipeline mode the next round is prepared while the user is judging the results
+    prefetcher = Prefetcher(qm, qa, target_precision) if pipeline else None
+    # in exploration mode the best of several candidate queries is shown each round
+    explorer = QueryExplorer(qm, qa, n_candidates=explore, latency_budget=explore_budget,
+                             instrumentation=instrumentation) if explore > 1 else None
 
-    current_query = INITIAL_QUERY
+    # the session is checkpointed after every fetch and every judgment, and can be resumed from there
+    checkpoint = SessionCheckpoint(checkpoint_path) if checkpoint_path is not None else None
+    current_query, current_results, current_feedback, round_number = INITIAL_QUERY, None, None, 0
+    if resume and checkpoint is not None and checkpoint.exists():
+        state = checkpoint.restore(qa)
+        current_query, current_results, current_feedback = state['query'], state['results'], state['feedback']
+        round_number = state['round']
+        print(f"Resuming round {round_number} of the session checkpointed in {checkpoint_path}")
+    STARTUP_PROFILE['restore checkpoint'] = time.perf_counter() - run_start
+
+    if instrumentation is not None:
+        instrumentation.next_round()
     # uses the ui_manager functions at appropriate junctions
-    um.display_initial(current_query)
-    current_results = qm.query(current_query)
-    current_feedback = um.display_and_input_feedback(current_results)
+    if current_results is None or current_feedback is None:
+        um.display_initial(current_query)
+    if current_results is None:
+        current_results = __query(qm, current_query)
+        round_number += 1
+        __checkpoint(checkpoint, qa, current_query, current_results, None, round_number, target_precision)
+    STARTUP_PROFILE['first results'] = time.perf_counter() - run_start
+    if current_feedback is None:
+        current_feedback = um.display_and_input_feedback(
+            current_results, __speculation_callback(prefetcher, current_query, current_results)
+        )
+        __checkpoint(checkpoint, qa, current_query, current_results, current_feedback, round_number, target_precision)
     current_precision = __calculate_precision(current_feedback)
 
     # we run the loop until program is successful or until no relevant document is found
     while(current_precision < target_precision and current_precision != 0.0):
-        updated_query, update = qa.augment_query(current_query, current_results, current_feedback)
+        if instrumentation is not None:
+            instrumentation.next_round()
+        if explorer is not None:
+            updated_query, update, updated_results = __explore(explorer, current_query, current_results, current_feedback)
+        else:
+            updated_query, update = qa.augment_query(current_query, current_results, current_feedback)
+            updated_results = None
         um.display_feedback_summary(current_query, current_precision, update)
         um.display_initial(updated_query)
-        updated_results =  qm.query(updated_query)
-        updated_feedback = um.display_and_input_feedback(updated_results)
+        if updated_results is None and prefetcher is not None:
+            updated_results = prefetcher.take(updated_query)
+        if updated_results is None:
+            updated_results = __query(qm, updated_query)
+        round_number += 1
+        __checkpoint(checkpoint, qa, updated_query, updated_results, None, round_number, target_precision)
+        updated_feedback = um.display_and_input_feedback(
+            updated_results, __speculation_callback(prefetcher, updated_query, updated_results)
+        )
+        __checkpoint(checkpoint, qa, updated_query, updated_results, updated_feedback, round_number, target_precision)
         current_precision = __calculate_precision(updated_feedback)
         current_query = updated_query
         current_feedback = updated_feedback
         current_results = updated_results
 
+    qa.save_parse_cache()
+    # the session is over, a later --resume starts a new one
+    if checkpoint is not None:
+        checkpoint.remove()
     # this is where the final call to the feedback is initiated i.e., either when the run is successful or when the program breaks
     um.display_feedback_summary(current_query, current_precision, None)
 
+    if profile_startup:
+        __print_startup_profile(qa)
+    if prefetcher is not None:
+        prefetcher.shutdown()
+        print(f"Speculation hit rate: {prefetcher.hits}/{prefetcher.hits + prefetcher.misses} rounds")
+    if explorer is not None:
+        print(f"Exploration: another candidate was shown in {explorer.switches} of {explorer.rounds} rounds")
+    qm.close()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['size']} entries")
+        cache.close()
+    if scheduler is not None:
+        stats = scheduler.stats()
+        print(f"API quota: {stats['quota_used']} of {stats['daily_quota']} requests used today, "
+              f"{stats['coalesced']} requests coalesced")
+
+def __export_instrumentation(instrumentation, metrics_jsonl, metrics_prometheus, cprofile_path):
+    instrumentation.stop()
+    if metrics_jsonl is not None:
+        with open(metrics_jsonl, 'w') as metrics_file:
+            metrics_file.write(instrumentation.to_json_lines())
+    if metrics_prometheus is not None:
+        with open(metrics_prometheus, 'w') as metrics_file:
+            metrics_file.write(instrumentation.to_prometheus())
+    if cprofile_path is not None:
+        instrumentation.profiler.dump_stats(cprofile_path)
+
+def __checkpoint(checkpoint, qa, query, results, feedback, round_number, target_precision):
+    if checkpoint is not None:
+        checkpoint.save(qa, query, results, feedback, round_number, target_precision)
+
+def __speculation_callback(prefetcher, query, results):
+    if prefetcher is None:
+        return None
+    return lambda feedback_so_far: prefetcher.speculate(query, results, feedback_so_far)
+
+def __query(qm, query):
+    # query errors end the session with a message, as before
+    try:
+        return qm.query(query)
+    except QueryError as error:
+        print(f"QUERY ERROR: {error}")
+        sys.exit()
+
+def __explore(explorer, query, results, feedback):
+    try:
+        return explorer.explore(query, results, feedback)
+    except QueryError as error:
+        print(f"QUERY ERROR: {error}")
+        sys.exit()
+
+def __print_startup_profile(qa):
+    # model load times are only known if the model was loaded during the session
+    if qa.loader_thread is not None:
+        qa.loader_thread.join()
+    print("STARTUP PROFILE")
+    for stage, seconds in list(STARTUP_PROFILE.items()) + list(qa.load_times.items()):
+        print(f"{stage:<28}{seconds * 1000:10.1f} ms")
+
 def __calculate_precision(feedback):
     # this simply calculates the mean and takes care of the case when there are less than 10 items
+    # (e.g. when near duplicates were collapsed, each distinct result is judged once)
     # when there are no results, thus no feedback, we end the program
     if len(feedback) == 0:
         return 0.0
-    return numpy.mean(feedback)
+    return sum(feedback) / len(feedback)
 
 if __name__ == '__main__':
     # expecting the user to run the command:
     # python3 feedback_augmented_search.py <API_KEY> <SEARCH_ENGINE_ID> <TARGET_PRECISION> <INITIAL_QUERY>
-    API_KEY = sys.argv[1]
-    SEARCH_ENGINE_ID = sys.argv[2]
-    TARGET_PRECISION = float(sys.argv[3])
-    INITIAL_QUERY = sys.argv[4]
-    run(API_KEY, SEARCH_ENGINE_ID, TARGET_PRECISION, INITIAL_QUERY)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Feedback-augmented search")
+    parser.add_argument('api_key')
+    parser.add_argument('engine_id')
+    parser.add_argument('target_precision', type=float)
+    parser.add_argument('initial_query')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print import and startup times at the end of the session")
+    parser.add_argument('--cache', dest='cache_path', default=None,
+                        help="SQLite file to cache search responses in")
+    parser.add_argument('--cache-mode', choices=ResponseCache.MODES, default='read_through',
+                        help="read_through (default), record, or offline to replay without network access")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="prepare and prefetch the next round while results are being judged")
+    parser.add_argument('--session-index', action='store_true',
+                        help="rank candidate words on every result judged in the session, not just the last round")
+    parser.add_argument('--embedding-weight', type=float, default=0.0,
+                        help="weight of the word vector similarity feature (0 switches it off)")
+    parser.add_argument('--checkpoint', dest='checkpoint_path', default=None,
+                        help="directory the session is checkpointed to after every round")
+    parser.add_argument('--resume', action='store_true',
+                        help="resume the session saved in --checkpoint instead of starting from the initial query")
+    parser.add_argument('--scheduler', dest='scheduler_path', default=None,
+                        help="SQLite file with the API rate limit and daily quota shared by all processes")
+    parser.add_argument('--rate', type=float, default=100 / 60,
+                        help="API requests per second allowed by the scheduler")
+    parser.add_argument('--daily-quota', type=int, default=10000,
+                        help="API requests per day allowed by the scheduler")
+    parser.add_argument('--duplicate-threshold', type=float, default=None,
+                        help="collapse results whose title and snippet are at least this similar (0-1)")
+    parser.add_argument('--backfill', action='store_true',
+                        help="with --duplicate-threshold, top up collapsed results from the next page")
+    parser.add_argument('--explore', type=int, default=0,
+                        help="fetch this many candidate queries each round and show the best page")
+    parser.add_argument('--explore-budget', type=float, default=3.0,
+                        help="seconds to wait for the candidate pages with --explore")
+    parser.add_argument('--metrics-jsonl', default=None,
+                        help="write per-stage timing events as JSON lines to this file")
+    parser.add_argument('--metrics-prometheus', default=None,
+                        help="write aggregated stage metrics in Prometheus text format to this file")
+    parser.add_argument('--cprofile', dest='cprofile_path', default=None,
+                        help="run cProfile during the session and dump the stats to this file")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="record the peak memory of every stage (with --metrics-*)")
+    args = parser.parse_args()
+    if args.resume and args.checkpoint_path is None:
+        parser.error("--resume needs --checkpoint")
+    if args.explore > 1 and args.pipeline:
+        parser.error("--explore prepares the next round itself, it cannot be used with --pipeline")
+
+    # instrumentation is only switched on when some output is asked for
+    instrumentation = None
+    if args.metrics_jsonl or args.metrics_prometheus or args.cprofile_path:
+        instrumentation = Instrumentation(profile=args.cprofile_path is not None,
+                                          trace_memory=args.tracemalloc)
+    scheduler = None
+    if args.scheduler_path is not None:
+        bucket = TokenBucket(args.scheduler_path, rate=args.rate, daily_quota=args.daily_quota)
+        scheduler = QueryScheduler(bucket, instrumentation=instrumentation)
+    run(args.api_key, args.engine_id, args.target_precision, args.initial_query,
+        profile_startup=args.profile_startup, cache_path=args.cache_path, cache_mode=args.cache_mode,
+        pipeline=args.pipeline, instrumentation=instrumentation, session_index=args.session_index,
+        scheduler=scheduler, checkpoint_path=args.checkpoint_path, resume=args.resume,
+        duplicate_threshold=args.duplicate_threshold, backfill=args.backfill,
+        explore=args.explore, explore_budget=args.explore_budget, embedding_weight=args.embedding_weight)
+    if instrumentation is not None:
+        __export_instrumentation(instrumentation, args.metrics_jsonl, args.metrics_prometheus,
+                                 args.cprofile_path)
\ No newline at end of file
@@ -0,0 +1,6 @@
+from .instrumentation import (
+    Instrumentation,
+    InstrumentationHook,
+    NullInstrumentation,
+    NULL_INSTRUMENTATION,
+)
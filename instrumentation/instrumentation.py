@@ -0,0 +1,194 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+
+class InstrumentationHook:
+    '''
+    Interface for receiving instrumentation events in a host application. Every event is
+    a dict with at least 'event' ('stage', 'count' or 'round') and 'round'
+    '''
+    def on_event(self, event):
+        raise NotImplementedError
+
+
+class StageTimer:
+    '''
+    Context manager returned by Instrumentation.stage, records one timed stage
+    '''
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        if self.instrumentation.trace_memory:
+            self.instrumentation.enter_memory_stage()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        peak_memory = self.instrumentation.exit_memory_stage() if self.instrumentation.trace_memory else None
+        self.instrumentation.record_stage(self.name, seconds, peak_memory)
+        return False
+
+
+class Instrumentation:
+    '''
+    Timers and counters per stage and per round of the feedback loop.
+
+    Stages are timed with `with instrumentation.stage(name):`, counters are bumped with
+    count(name). Events are kept for export as JSON lines, aggregated for the Prometheus
+    text format, and passed to the registered hooks. profile=True runs cProfile while
+    instrumentation is enabled and trace_memory=True records the peak traced memory of
+    every stage with tracemalloc. The tracemalloc peak is process-wide, so it is only reset
+    when no stage is running: a nested stage, or one running on another thread at the same
+    time, reports the peak since the outermost running stage started, never less than its own.
+    '''
+    def __init__(self, profile=False, trace_memory=False, hooks=None):
+        self.enabled = True
+        self.round = 0
+        self.events = []
+        self.hooks = list(hooks) if hooks is not None else []
+        # stage -> [calls, total seconds, max peak memory]
+        self.stage_totals = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+        self.trace_memory = trace_memory
+        # stages running (on any thread) while memory is traced
+        self.memory_stages = 0
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.profiler = cProfile.Profile() if profile else None
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def enter_memory_stage(self):
+        with self.lock:
+            if self.memory_stages == 0:
+                tracemalloc.reset_peak()
+            self.memory_stages += 1
+
+    def exit_memory_stage(self):
+        with self.lock:
+            self.memory_stages -= 1
+            return tracemalloc.get_traced_memory()[1]
+
+    def __repr__(self) -> str:
+        return f'Instrumentation(round={self.round}, stages={list(self.stage_totals)}, counters={self.counters})'
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def stage(self, name):
+        return StageTimer(self, name)
+
+    def next_round(self):
+        with self.lock:
+            self.round += 1
+        self.emit({'event': 'round', 'round': self.round})
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        self.emit({'event': 'count', 'round': self.round, 'name': name, 'value': value})
+
+    def record_stage(self, name, seconds, peak_memory=None):
+        with self.lock:
+            totals = self.stage_totals.setdefault(name, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            if peak_memory is not None:
+                totals[2] = max(totals[2], peak_memory)
+        event = {'event': 'stage', 'round': self.round, 'stage': name, 'seconds': seconds,
+                 'thread': threading.current_thread().name}
+        if peak_memory is not None:
+            event['peak_memory_bytes'] = peak_memory
+        self.emit(event)
+
+    def emit(self, event):
+        with self.lock:
+            self.events.append(event)
+        for hook in self.hooks:
+            hook.on_event(event)
+
+    def stop(self):
+        '''
+        Stops the profiler and memory tracing
+        '''
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def to_json_lines(self):
+        with self.lock:
+            return ''.join(json.dumps(event) + '\n' for event in self.events)
+
+    def to_prometheus(self, prefix='feedback_augmented_search'):
+        lines = []
+        with self.lock:
+            stages = sorted(self.stage_totals.items())
+            # samples of a metric family must follow its TYPE line
+            lines.append(f'# TYPE {prefix}_stage_calls_total counter')
+            for name, (calls, _, _) in stages:
+                lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {calls}')
+            lines.append(f'# TYPE {prefix}_stage_seconds_total counter')
+            for name, (_, seconds, _) in stages:
+                lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {seconds}')
+            if self.trace_memory:
+                lines.append(f'# TYPE {prefix}_stage_peak_memory_bytes gauge')
+                for name, (_, _, peak_memory) in stages:
+                    lines.append(f'{prefix}_stage_peak_memory_bytes{{stage="{name}"}} {peak_memory}')
+            lines.append(f'# TYPE {prefix}_events_total counter')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+            lines.append(f'# TYPE {prefix}_rounds gauge')
+            lines.append(f'{prefix}_rounds {self.round}')
+        return '\n'.join(lines) + '\n'
+
+    def profile_stats(self, sort='cumulative', limit=30):
+        '''
+        The cProfile report as text, None if profiling is off
+        '''
+        if self.profiler is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class NullInstrumentation:
+    '''
+    Instrumentation that records nothing, used when instrumentation is disabled.
+    stage() returns one shared no-op context manager so a disabled stage costs a method call
+    '''
+    enabled = False
+    round = 0
+    NULL_STAGE = nullcontext()
+
+    def stage(self, name):
+        return self.NULL_STAGE
+
+    def next_round(self):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def add_hook(self, hook):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
@@ -0,0 +1 @@
+from .prefetcher import Prefetcher
\ No newline at end of file
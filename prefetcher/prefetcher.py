@@ -0,0 +1,114 @@
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Prefetcher:
+    '''
+    Speculatively prepares the next round while the user is still judging results.
+
+    When every result but the last one is judged, the next query only depends on the last
+    judgment. A background worker augments the query on the full results for both outcomes
+    of it (on copies of the augmenter, so its state such as k is not touched), which also warms
+    the parse cache for the results marked relevant, and prefetches the results of both
+    candidate queries. Outcomes that end the session (no relevant result, or the target
+    precision reached) are not speculated. When the real next query is known, take() returns
+    its prefetched results; the other speculation is discarded.
+    '''
+    def __init__(self, qm, qa, target_precision=None):
+        self.qm = qm
+        self.qa = qa
+        self.target_precision = target_precision
+        self.augment_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='speculate')
+        self.fetch_worker = ThreadPoolExecutor(max_workers=2, thread_name_prefix='prefetch')
+        self.lock = threading.Lock()
+        self.latest_snapshot = None
+        # speculated query -> future of its results, for the current round
+        self.speculations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f'Prefetcher(hits={self.hits}, misses={self.misses})'
+
+    def speculate(self, current_query, current_results, feedback_so_far):
+        '''
+        Called after every judgment with the feedback given so far
+        '''
+        # before the last judgment, only one judgment is left unknown
+        if len(feedback_so_far) != len(current_results) - 1:
+            return
+        snapshot = (current_query, current_results, list(feedback_so_far))
+        with self.lock:
+            self.latest_snapshot = snapshot
+        self.augment_worker.submit(self.run_speculation, snapshot)
+
+    def run_speculation(self, snapshot):
+        current_query, results, feedback_so_far = snapshot
+        for last_judgment in (1, 0):
+            with self.lock:
+                # take() ended the round (or a newer judgment came in) in the meantime
+                if snapshot is not self.latest_snapshot:
+                    return
+            feedback = feedback_so_far + [last_judgment]
+            if self.ends_session(feedback):
+                continue
+            try:
+                candidate_query, _ = self.speculative_augmenter().augment_query(current_query, results, feedback)
+            except Exception:
+                # the real round will tell
+                continue
+            with self.lock:
+                if snapshot is not self.latest_snapshot:
+                    return
+                if candidate_query not in self.speculations:
+                    # with a scheduler, prefetches wait behind the requests of interactive rounds
+                    self.speculations[candidate_query] = self.fetch_worker.submit(
+                        self.qm.query, candidate_query, 'prefetch'
+                    )
+
+    def ends_session(self, feedback):
+        # same stopping rule as run()
+        precision = sum(feedback) / len(feedback)
+        return precision == 0.0 or (self.target_precision is not None and precision >= self.target_precision)
+
+    def speculative_augmenter(self):
+        # the parse cache and word vectors must exist before copying so that the copy shares
+        # them. Without their weights they (and the spaCy model) are never needed
+        if self.qa.dependency_weight != 0:
+            self.qa.parse_cache
+        if self.qa.embedding_weight != 0:
+            self.qa.word_vectors
+        speculative_qa = copy.copy(self.qa)
+        # the session index is updated by augment_query, so speculation works on its own copy
+        if self.qa.document_index is not None:
+            speculative_qa.document_index = copy.deepcopy(self.qa.document_index)
+        return speculative_qa
+
+    def take(self, query):
+        '''
+        Returns the prefetched results of query, or None if it was not speculated (or the
+        prefetch failed). Ends the round, discarding all other speculations
+        '''
+        with self.lock:
+            speculations = self.speculations
+            self.speculations = {}
+            self.latest_snapshot = None
+        future = speculations.pop(query, None)
+        for wrong_future in speculations.values():
+            wrong_future.cancel()
+
+        if future is None:
+            self.misses += 1
+            return None
+        try:
+            results = future.result()
+        except Exception:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return results
+
+    def shutdown(self):
+        self.augment_worker.shutdown(wait=False, cancel_futures=True)
+        self.fetch_worker.shutdown(wait=False, cancel_futures=True)
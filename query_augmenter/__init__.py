@@ -1 +1,2 @@
-from .query_augmenter import QueryAugmenter
\ No newline at end of file
+from .query_augmenter import QueryAugmenter
+from .batch import augment_many
@@ -0,0 +1,66 @@
+from .term_matrix import TermStatistics
+
+
+def augment_many(batch, return_exceptions=False):
+    '''
+    Augments the queries of many sessions at once. batch is a list of
+    (augmenter, query, results, feedback), with each augmenter (the state of one session)
+    at most once. Returns the (new query, appended terms) of every entry, identical to
+    calling augmenter.augment_query one by one, but:
+    - the relevant snippets of all the augmenters sharing a ParseCache are parsed together,
+      in one nlp.pipe call
+    - the gini gains of all the term statistics are computed with one set of array operations
+
+    With return_exceptions, an entry that fails gets its exception in place of its new
+    query, otherwise the first exception is raised once the whole batch is done
+    '''
+    augmenters = [augmenter for augmenter, _, _, _ in batch]
+    if len(set(map(id, augmenters))) != len(augmenters):
+        raise ValueError("each augmenter can only appear once in a batch")
+
+    outcomes = [None] * len(batch)
+    augmentations = {}
+    for i, (augmenter, query, results, feedback) in enumerate(batch):
+        try:
+            augmentations[i] = augmenter.start_augmentation(query, results, feedback)
+        except Exception as error:
+            outcomes[i] = error
+
+    # one parse per shared cache, each augmenter then takes its own docs
+    texts_by_cache = {}
+    for i, augmentation in augmentations.items():
+        augmenter = batch[i][0]
+        if augmenter.dependency_weight == 0:
+            continue
+        texts = augmenter.relevant_summaries(augmentation['results'], augmentation['feedback'])
+        cache = augmenter.parse_cache
+        texts_by_cache.setdefault(id(cache), (cache, []))[1].append((i, texts))
+    for cache, entries in texts_by_cache.values():
+        try:
+            docs = cache.parse([text for _, texts in entries for text in texts])
+        except Exception as error:
+            for i, _ in entries:
+                outcomes[i] = error
+                del augmentations[i]
+            continue
+        start = 0
+        for i, texts in entries:
+            augmentations[i]['context'].set('relevant_parses', docs[start:start + len(texts)])
+            start += len(texts)
+
+    TermStatistics.batch_gini_gains([
+        augmentation['statistics'] for augmentation in augmentations.values()
+        if augmentation['statistics'] is not None
+    ])
+
+    for i, augmentation in augmentations.items():
+        try:
+            outcomes[i] = batch[i][0].finish_augmentation(augmentation)
+        except Exception as error:
+            outcomes[i] = error
+
+    if not return_exceptions:
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                raise outcome
+    return outcomes
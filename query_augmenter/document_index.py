@@ -0,0 +1,171 @@
+from collections import Counter
+import numpy
+from .term_matrix import TermStatistics
+
+
+class DocumentIndex:
+    '''
+    Session-scoped index of every judged result, keyed by URL. It keeps per-word document
+    frequency, relevant document frequency and relevant term frequency, and updates them by
+    delta. A new result adds its counts, and a result that comes back with a different
+    judgment only moves its counts between relevant and irrelevant. Ranking can then use
+    every judged document of the session without rebuilding anything.
+    '''
+    def __init__(self, initial_capacity=1024):
+        # url -> {'ids': word ids, 'frequencies': their counts, 'judgment': 0/1}
+        self.loaded_documents = {}
+        self.loaded_words = []
+        self.loaded_word_ids = {}
+        # (urls, words, arrays) of an index restored by from_arrays, until they are first used
+        self.stored = None
+        self.doc_freq = numpy.zeros(initial_capacity, dtype=numpy.int64)
+        self.relevant_doc_freq = numpy.zeros(initial_capacity, dtype=numpy.int64)
+        self.relevant_term_freq = numpy.zeros(initial_capacity, dtype=numpy.int64)
+        self.n_relevant = 0
+
+    def __repr__(self) -> str:
+        return f'DocumentIndex(documents={len(self.documents)}, relevant={self.n_relevant}, words={len(self.words)})'
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def documents(self):
+        self.load_stored()
+        return self.loaded_documents
+
+    @property
+    def words(self):
+        self.load_stored()
+        return self.loaded_words
+
+    @property
+    def word_ids(self):
+        self.load_stored()
+        return self.loaded_word_ids
+
+    def load_stored(self):
+        # a restored index decodes its words and urls on first use, so restoring is constant time
+        if self.stored is None:
+            return
+        urls, words, arrays = self.stored
+        self.stored = None
+        self.loaded_words = list(words)
+        self.loaded_word_ids = {word: word_id for word_id, word in enumerate(self.loaded_words)}
+        offsets = arrays['document_offsets']
+        for i, url in enumerate(urls):
+            start, end = offsets[i], offsets[i + 1]
+            self.loaded_documents[url] = {
+                'ids': arrays['document_ids'][start:end],
+                'frequencies': arrays['document_frequencies'][start:end],
+                'judgment': int(arrays['judgments'][i]),
+            }
+
+    def word_id(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.words.append(word)
+            self.word_ids[word] = word_id
+            if word_id == len(self.doc_freq):
+                self.grow()
+        return word_id
+
+    def grow(self):
+        # capacity doubles, so adding words is amortized constant time
+        for name in ('doc_freq', 'relevant_doc_freq', 'relevant_term_freq'):
+            array = getattr(self, name)
+            extra = numpy.zeros(max(len(array), 1), dtype=array.dtype)
+            setattr(self, name, numpy.concatenate([array, extra]))
+
+    def update(self, results, feedback, extract_words):
+        '''
+        Adds a round of results and their judgments. extract_words(results) tokenizes the
+        results that are not in the index yet, the others are updated in place
+        '''
+        new_results, new_judgments, new_urls = [], [], set()
+        for result, judgment in zip(results, feedback):
+            url = result['URL']
+            if url in self.documents:
+                self.set_judgment(url, judgment)
+            elif url not in new_urls:
+                new_urls.add(url)
+                new_results.append(result)
+                new_judgments.append(judgment)
+        if not new_results:
+            return
+
+        documents, _ = extract_words(new_results)
+        for result, document, judgment in zip(new_results, documents, new_judgments):
+            counts = Counter(document['title'] + document['summary'])
+            self.add(result['URL'], counts, judgment)
+
+    def add(self, url, counts, judgment):
+        ids = numpy.array([self.word_id(word) for word in counts], dtype=numpy.int64)
+        frequencies = numpy.array(list(counts.values()), dtype=numpy.int64)
+        self.documents[url] = {'ids': ids, 'frequencies': frequencies, 'judgment': 0}
+        self.doc_freq[ids] += 1
+        self.set_judgment(url, judgment)
+
+    def set_judgment(self, url, judgment):
+        document = self.documents[url]
+        delta = judgment - document['judgment']
+        if delta == 0:
+            return
+        ids = document['ids']
+        self.relevant_doc_freq[ids] += delta
+        self.relevant_term_freq[ids] += delta * document['frequencies']
+        self.n_relevant += delta
+        document['judgment'] = judgment
+
+    def to_arrays(self):
+        '''
+        (urls, words, arrays): the index as flat arrays, the per-document ids and frequencies
+        concatenated with their offsets, for the session checkpoint
+        '''
+        urls = list(self.documents.keys())
+        documents = list(self.documents.values())
+        lengths = [len(document['ids']) for document in documents]
+        n_words = len(self.words)
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        arrays = {
+            'doc_freq': self.doc_freq[:n_words],
+            'relevant_doc_freq': self.relevant_doc_freq[:n_words],
+            'relevant_term_freq': self.relevant_term_freq[:n_words],
+            'document_offsets': numpy.concatenate([[0], numpy.cumsum(lengths)]).astype(numpy.int64),
+            'document_ids': numpy.concatenate([d['ids'] for d in documents]) if documents else empty,
+            'document_frequencies': numpy.concatenate([d['frequencies'] for d in documents]) if documents else empty,
+            'judgments': numpy.array([d['judgment'] for d in documents], dtype=numpy.int64),
+        }
+        return urls, list(self.words), arrays
+
+    @classmethod
+    def from_arrays(cls, urls, words, arrays):
+        '''
+        Rebuilds an index from to_arrays(). The arrays may be copy-on-write memory maps, the
+        documents are views into them. urls and words are sequences of strings, only read when
+        the index is first used
+        '''
+        index = cls(initial_capacity=0)
+        index.doc_freq = arrays['doc_freq']
+        index.relevant_doc_freq = arrays['relevant_doc_freq']
+        index.relevant_term_freq = arrays['relevant_term_freq']
+        index.n_relevant = int(arrays['judgments'].sum())
+        index.stored = (urls, words, arrays)
+        return index
+
+    def statistics(self, query_terms):
+        '''
+        TermStatistics over every judged document of the session
+        '''
+        for query_term in query_terms:
+            self.word_id(query_term)
+        n_words = len(self.words)
+        return TermStatistics(
+            self.words,
+            doc_freq=self.doc_freq[:n_words],
+            relevant_doc_freq=self.relevant_doc_freq[:n_words],
+            relevant_term_freq=self.relevant_term_freq[:n_words],
+            n_documents=len(self.documents),
+            n_relevant=self.n_relevant,
+        )
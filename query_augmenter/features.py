@@ -0,0 +1,141 @@
+from math import log
+
+import numpy
+
+
+class FeatureContext:
+    '''
+    Inputs of the ranking features of one augment_query call. Each input is registered
+    with a function that computes it, and is only computed the first time a feature asks
+    for it. Features with a zero weight never ask, so their inputs are never computed
+    '''
+    def __init__(self):
+        self.providers = {}
+        self.values = {}
+
+    def provide(self, name, function):
+        self.providers[name] = function
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            self.values[name] = self.providers[name]()
+        return self.values[name]
+
+    def inputs_of(self, feature):
+        '''
+        The view of the context a feature scores with, limited to the inputs it declares
+        '''
+        return FeatureInputs(self, feature)
+
+
+class FeatureInputs:
+    '''
+    Read access to the declared inputs of one feature, so the declarations can't drift from
+    what score() actually reads
+    '''
+    def __init__(self, context, feature):
+        self.context = context
+        self.feature = feature
+
+    def __repr__(self) -> str:
+        return f'FeatureInputs(feature={self.feature.name}, inputs={self.feature.inputs})'
+
+    def __getitem__(self, name):
+        if name not in self.feature.inputs:
+            raise KeyError(f"{type(self.feature).__name__} reads {name!r} without declaring it in inputs")
+        return self.context[name]
+
+
+class RankingFeature:
+    '''
+    A ranking stage. It declares the context inputs it reads, and the QueryAugmenter
+    attribute holding its weight. score() returns an unweighted score for every word;
+    the augmenter adds weight * score to the ranking of the word
+    '''
+    name = None
+    weight_attribute = None
+    inputs = ()
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(weight_attribute={self.weight_attribute}, inputs={self.inputs})'
+
+    def score(self, qa, context, words):
+        raise NotImplementedError
+
+
+class FrequencyFeature(RankingFeature):
+    '''
+    log(1 + frequency of the word in relevant docs)
+    '''
+    name = 'frequency'
+    weight_attribute = 'frequency_weight'
+    inputs = ('frequency_boost',)
+
+    def score(self, qa, context, words):
+        # the ranking engine provides log(1 + f) per word, computed from its own counts
+        frequency_boost = context['frequency_boost']
+        return {word: frequency_boost(word) for word in words}
+
+
+class DependencyFeature(RankingFeature):
+    '''
+    log(1 + number of dependencies between the word and the query terms in relevant snippets)
+    '''
+    name = 'dependency'
+    weight_attribute = 'dependency_weight'
+    inputs = ('relevant_parses', 'query_terms')
+
+    def score(self, qa, context, words):
+        counts = qa.dependency_counts(context['relevant_parses'], words, context['query_terms'])
+        return {word: log(1.0 + counts[word]) for word in words}
+
+
+class ProximityFeature(RankingFeature):
+    '''
+    log(1 + number of relevant docs in which the word is within window_size of a query term)
+    '''
+    name = 'proximity'
+    weight_attribute = 'proximity_weight'
+    inputs = ('proximity_counts',)
+
+    def score(self, qa, context, words):
+        counts = context['proximity_counts']
+        return {word: log(1.0 + counts.get(word, 0)) for word in words}
+
+
+class EmbeddingFeature(RankingFeature):
+    '''
+    cos(word, relevant centroid) - cos(word, irrelevant centroid), with the static word
+    vectors of the spaCy model. A centroid is the mean of the document vectors, and a document
+    vector is the mean unit vector of its words. All the words are scored with one
+    matrix-vector product
+    '''
+    name = 'embedding'
+    weight_attribute = 'embedding_weight'
+    inputs = ('word_vectors', 'documents', 'feedback')
+
+    def score(self, qa, context, words):
+        word_vectors = context['word_vectors']
+        documents = context['documents']
+        feedback = context['feedback']
+        relevant_centroid, irrelevant_centroid = [
+            word_vectors.centroid([
+                document['title'] + document['summary']
+                for document, judgment in zip(documents, feedback) if judgment == relevance
+            ])
+            for relevance in (1, 0)
+        ]
+
+        words = list(words)
+        scores = word_vectors.unit_vectors(words) @ (
+            self.unit(relevant_centroid) - self.unit(irrelevant_centroid)
+        )
+        return {word: float(word_score) for word, word_score in zip(words, scores)}
+
+    @staticmethod
+    def unit(vector):
+        norm = numpy.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+
+# python3 -m query_augmenter.generate_stop_words [--check]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(ROOT, 'stop_words.txt')
+TARGET = os.path.join(ROOT, 'query_augmenter', 'stop_words.py')
+HEADER = (
+    "# generated from stop_words.txt, imported as a module so that it is loaded from the\n"
+    "# package (independent of the working directory) and cached as bytecode\n"
+    "# regenerate with: python3 -m query_augmenter.generate_stop_words\n"
+)
+LINE_WIDTH = 88
+
+
+def read_stop_words(path=SOURCE):
+    with open(path, 'r') as stop_words_file:
+        return sorted(set(line.strip() for line in stop_words_file if line.strip()))
+
+
+def render(stop_words):
+    '''
+    Source of stop_words.py, the sorted words packed into lines of at most LINE_WIDTH
+    '''
+    lines, line = [], '   '
+    for word in stop_words:
+        item = f' {word!r},'
+        if len(line) + len(item) > LINE_WIDTH:
+            lines.append(line)
+            line = '   '
+        line += item
+    lines.append(line)
+    return HEADER + 'STOP_WORDS = frozenset([\n' + '\n'.join(lines) + '\n])\n'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate query_augmenter/stop_words.py from stop_words.txt")
+    parser.add_argument('--check', action='store_true',
+                        help="exit with status 1 if stop_words.py is out of date instead of writing it")
+    args = parser.parse_args()
+
+    source = render(read_stop_words())
+    if args.check:
+        with open(TARGET, 'r') as target_file:
+            if target_file.read() != source:
+                print(f"{TARGET} is out of date with {SOURCE}, regenerate it")
+                sys.exit(1)
+        print(f"{TARGET} is up to date")
+    else:
+        with open(TARGET, 'w') as target_file:
+            target_file.write(source)
@@ -0,0 +1,102 @@
+from bisect import bisect_right
+from itertools import permutations
+
+
+class OrderingEngine:
+    '''
+    Chooses the order of query terms best supported by the relevant documents, without
+    compiling a regex per permutation.
+
+    The score of an order is the number of non-overlapping, in-order occurrences of its
+    terms in a document, the token-level equivalent of findall('.*?q1.*?q2...') used by
+    QueryAugmenter.subsequence_count_of_order. It is computed in a single left-to-right
+    pass that only visits the positions of the query terms.
+    Small queries are scored exhaustively. Larger ones are searched with a beam over
+    pairwise precedence scores, and the surviving orders are scored exactly.
+    '''
+    def __init__(self, beam_width=8, exhaustive_limit=6):
+        self.beam_width = beam_width
+        self.exhaustive_limit = exhaustive_limit
+
+    @staticmethod
+    def term_positions(terms, tokens):
+        '''
+        Returns {term: sorted list of positions of term in tokens} for the given terms
+        '''
+        positions = {term: [] for term in terms}
+        for i, token in enumerate(tokens):
+            if token in positions:
+                positions[token].append(i)
+        return positions
+
+    @staticmethod
+    def count_order(order, positions):
+        '''
+        Number of non-overlapping occurrences of order as a subsequence of the document,
+        taking the earliest next term each time. positions comes from term_positions
+        '''
+        count = 0
+        position = -1
+        while True:
+            for term in order:
+                term_positions = positions[term]
+                next_i = bisect_right(term_positions, position)
+                if next_i == len(term_positions):
+                    return count
+                position = term_positions[next_i]
+            count += 1
+
+    def score(self, order, documents_positions):
+        return sum(self.count_order(order, positions) for positions in documents_positions)
+
+    def precedence_scores(self, terms, documents_positions):
+        '''
+        precedence[a][b] is the score of the order (a, b) over all documents
+        '''
+        return {
+            a: {b: self.score((a, b), documents_positions) for b in terms if b != a}
+            for a in terms
+        }
+
+    def best_order(self, terms, documents):
+        '''
+        Returns the best order of terms for the tokenized documents (lists of words).
+        Ties are broken like QueryAugmenter.reorder, by the first order in permutation order
+        '''
+        documents_positions = [self.term_positions(terms, tokens) for tokens in documents]
+
+        if len(terms) <= self.exhaustive_limit:
+            candidates = permutations(terms, len(terms))
+        else:
+            candidates = self.beam_search(terms, documents_positions)
+
+        best_order, best_score = None, -1
+        for order in candidates:
+            order_score = self.score(order, documents_positions)
+            if order_score > best_score:
+                best_order, best_score = order, order_score
+        return list(best_order)
+
+    def beam_search(self, terms, documents_positions):
+        '''
+        Builds orders term by term, keeping the beam_width prefixes with the highest sum of
+        pairwise precedence scores. Returns the complete orders left in the beam
+        '''
+        precedence = self.precedence_scores(set(terms), documents_positions)
+        # each beam entry is (score, prefix, indices of terms left)
+        beam = [(0, (), tuple(range(len(terms))))]
+        for _ in range(len(terms)):
+            expanded = []
+            for prefix_score, prefix, remaining in beam:
+                for i in remaining:
+                    term = terms[i]
+                    gain = sum(precedence[placed][term] for placed in prefix if placed != term)
+                    expanded.append((
+                        prefix_score + gain,
+                        prefix + (term,),
+                        tuple(j for j in remaining if j != i),
+                    ))
+            # sort is stable, so equal scores keep the permutation order of the terms
+            expanded.sort(key=lambda entry: -entry[0])
+            beam = expanded[:self.beam_width]
+        return [prefix for _, prefix, _ in beam]
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class ParseCache:
+    '''
+    LRU cache of spaCy parses keyed by a hash of the parsed text. Missing texts are parsed
+    in batches through nlp.pipe with only the components the dependency stage needs, and
+    the cache can be saved to and loaded from disk with a spaCy DocBin.
+    '''
+    # the parser reads its features from tok2vec, everything else (ner, lemmatizer, ...) is skipped
+    ENABLED_PIPES = ('tok2vec', 'tagger', 'parser')
+
+    def __init__(self, nlp, max_size=1024, batch_size=32, path=None):
+        self.nlp = nlp
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.path = path
+        self.docs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        # parses may be requested from a background thread as well
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def disabled_pipes(self):
+        return [name for name in self.nlp.pipe_names if name not in self.ENABLED_PIPES]
+
+    def parse(self, texts):
+        '''
+        Returns the parsed spaCy Doc of every text, in order. The lock is only held to look
+        up and insert docs, so threads sharing the cache parse at the same time (two threads
+        missing the same text may both parse it)
+        '''
+        keys = [self.key(text) for text in texts]
+        found = {}
+        # texts to parse, each distinct text only once
+        missing = {}
+        with self.lock:
+            for key, text in zip(keys, texts):
+                if key in self.docs:
+                    self.hits += 1
+                    self.docs.move_to_end(key)
+                    found[key] = self.docs[key]
+                elif key not in missing:
+                    self.misses += 1
+                    missing[key] = text
+
+        if missing:
+            parsed = self.nlp.pipe(
+                missing.values(), batch_size=self.batch_size, disable=self.disabled_pipes()
+            )
+            found.update(zip(missing.keys(), parsed))
+            with self.lock:
+                for key in missing:
+                    self.docs[key] = found[key]
+                self.dirty = True
+                self.evict()
+
+        return [found[key] for key in keys]
+
+    def evict(self):
+        while len(self.docs) > self.max_size:
+            self.docs.popitem(last=False)
+
+    def save(self, path=None):
+        '''
+        Writes all cached docs to path (defaults to the path the cache was created with)
+        '''
+        from spacy.tokens import DocBin
+
+        path = path if path is not None else self.path
+        with self.lock:
+            docs = list(self.docs.values())
+            self.dirty = False
+        DocBin(docs=docs).to_disk(path)
+
+    def load(self, path):
+        '''
+        Adds the docs saved at path to the cache. Keys are recomputed from the doc text
+        '''
+        from spacy.tokens import DocBin
+
+        doc_bin = DocBin().from_disk(path)
+        with self.lock:
+            for doc in doc_bin.get_docs(self.nlp.vocab):
+                self.docs[self.key(doc.text)] = doc
+            self.evict()
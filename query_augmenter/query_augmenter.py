@@ -1,54 +1,260 @@
 import regex as re
+import threading
+import time
 from math import log
-import spacy
-from itertools import permutations
+from itertools import combinations, permutations
+from .term_matrix import TermMatrix
+from .ordering import OrderingEngine
+from .parse_cache import ParseCache
+from .document_index import DocumentIndex
+from .features import FeatureContext, FrequencyFeature, DependencyFeature, ProximityFeature, EmbeddingFeature
+from .stop_words import STOP_WORDS
+from .tokenized_document import DocumentStore, Tokenizer
+from .word_vectors import WordVectors
+from instrumentation import NULL_INSTRUMENTATION
 
 class QueryAugmenter:
-    def __init__(self):
-        self.pattern = re.compile(r"’s|’t|’re|’ve|’m|’ll|’d| ?\w+")
-
-        self.nlp = spacy.load("en_core_web_md")
-
-        self.stop_words = set()
-        with open(
-            "./stop_words.txt", "r"
-        ) as stop_words_file:
-            for line in stop_words_file:
-                self.stop_words.add(line.strip())
+    def __init__(self, parse_cache_path=None, nlp=None, instrumentation=None, session_index=False,
+                 embedding_weight=0.0):
+        self.stop_words = STOP_WORDS
+        # every result is tokenized once and shared by all the stages that read it
+        self.tokenizer = Tokenizer()
+        self.document_store = DocumentStore(self.stop_words, self.tokenizer)
+
+        # spaCy and en_core_web_md are only loaded when first needed, or in the background
+        # with load_model_in_background(), so that constructing the augmenter is cheap.
+        # An already loaded model can be passed as nlp to share it between augmenters
+        self.model_name = "en_core_web_md"
+        self.loaded_nlp = nlp
+        self.loader_thread = None
+        self.loader_error = None
+        self.load_times = {}
+        # parses of snippets are kept across rounds, and across sessions if a path is given
+        self.parse_cache_path = parse_cache_path
+        self.loaded_parse_cache = None
+        # static vectors of the model, looked up once per word
+        self.loaded_word_vectors = None
+
+        # stage timings go to the instrumentation, the null one records nothing
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
         self.window_size = 2
         self.k = 0.6 # min ratio of relevant docs for selecting words_to_search
         self.frequency_weight = 1.0
         self.dependency_weight = 1.0
+        # weight of closeness to query terms, not used by default based on experimentation
+        self.proximity_weight = 0.0
+        # weight of the similarity of word vectors to the relevant docs over the irrelevant ones,
+        # off by default so that rankings stay as they were until the weight is tuned
+        self.embedding_weight = embedding_weight
+        # ranking features added to the gini gain in this order, each weighted by its weight
+        # attribute. Features with a zero weight (and the inputs only they need) are skipped
+        self.features = [FrequencyFeature(), DependencyFeature(), ProximityFeature(), EmbeddingFeature()]
         self.threshold_for_append = 0.2
+        # 'matrix' ranks the whole vocab with array operations on a TermMatrix,
+        # 'inverse_list' is the original per-word implementation. Both give identical rankings
+        self.ranking_engine = 'matrix'
+        # 'fast' orders the new query with the OrderingEngine, 'regex' tries every permutation
+        # with a regex, 'check' runs both (up to check_limit terms) and counts disagreements
+        self.reorder_mode = 'fast'
+        self.ordering_engine = OrderingEngine()
+        self.check_limit = 6
+        self.reorder_mismatches = 0
+        # with a session index, gini and frequency rankings use every result judged in the
+        # session instead of only the current round
+        self.document_index = DocumentIndex() if session_index else None
+
+    @property
+    def nlp(self):
+        '''
+        The spaCy model, waits for the background load if one was started
+        '''
+        if self.loaded_nlp is None:
+            if self.loader_thread is not None:
+                self.loader_thread.join()
+                if self.loader_error is not None:
+                    raise self.loader_error
+            else:
+                self.load_model()
+        return self.loaded_nlp
+
+    @property
+    def parse_cache(self):
+        if self.loaded_parse_cache is None:
+            self.loaded_parse_cache = ParseCache(self.nlp, path=self.parse_cache_path)
+        return self.loaded_parse_cache
+
+    @property
+    def word_vectors(self):
+        if self.loaded_word_vectors is None:
+            self.loaded_word_vectors = WordVectors(self.nlp.vocab)
+        return self.loaded_word_vectors
+
+    def load_model(self):
+        start = time.perf_counter()
+        import spacy
+        self.load_times['import spacy'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        nlp = spacy.load(self.model_name)
+        self.load_times[f'load {self.model_name}'] = time.perf_counter() - start
+        self.loaded_nlp = nlp
+
+    def load_model_in_background(self):
+        '''
+        Starts loading the spaCy model on a daemon thread and returns immediately
+        '''
+        if self.loaded_nlp is not None or self.loader_thread is not None:
+            return
+
+        def load():
+            try:
+                self.load_model()
+            except Exception as error:
+                self.loader_error = error
+
+        self.loader_thread = threading.Thread(target=load, name="spacy-loader", daemon=True)
+        self.loader_thread.start()
 
     def augment_query(self, current_query, current_results, current_feedback):
         '''
         augments a query based on feedback and the results.
         '''
-        # terms in the query
-        query_terms = [w.lower().strip() for w in re.findall(self.pattern, current_query)]
+        return self.finish_augmentation(
+            self.start_augmentation(current_query, current_results, current_feedback)
+        )
 
-        # filtered words and the vocab in the results
-        documents, vocab = self.extract_words(current_results, query_terms)
-        # Step 1: get the inverse lists for words
-        inverse_list = self.construct_inverse_list(documents, vocab, query_terms)
+    def augment_candidates(self, current_query, current_results, current_feedback, n_candidates=3):
+        '''
+        Like augment_query, but returns up to n_candidates (new query, appended terms), best
+        first. The first candidate is the query augment_query would return
+        '''
+        augmentation = self.start_augmentation(current_query, current_results, current_feedback)
+        rankings = self.final_rankings(augmentation)
+        with self.instrumentation.stage('get_new_queries'):
+            return self.get_new_queries(
+                rankings, augmentation['results'], augmentation['feedback'], augmentation['query_terms'],
+                n_candidates
+            )
 
-        # Step 2: candidate words to append in the query
-        words_to_search = self.get_words_to_search(
-            current_feedback, vocab, query_terms, inverse_list
-        )
-        words_to_search.extend(query_terms) # We want to also rank the query terms for ordering
+    def start_augmentation(self, current_query, current_results, current_feedback):
+        '''
+        First half of augment_query: collects the term statistics of the results (steps 1-2
+        with the inverse list). Returns the state finish_augmentation ranks words from, so that
+        augment_many can batch the work of several augmenters in between
+        '''
+        # terms in the query
+        query_terms = self.tokenizer.tokenize(current_query)
+
+        stage = self.instrumentation.stage
+        self.instrumentation.count('augment_query')
+
+        # inputs of the ranking features, only computed if a feature with a nonzero weight needs them
+        context = FeatureContext()
+        context.set('query_terms', query_terms)
+        context.set('feedback', current_feedback)
+        context.provide('word_vectors', lambda: self.word_vectors)
+        context.provide('documents', lambda: self.extract_words(current_results, query_terms)[0])
+        context.provide('relevant_parses', lambda: self.parse_relevant_summaries(current_results, current_feedback))
+        context.provide('proximity_counts', lambda: self.proximity_counts(
+            context['documents'], current_feedback, query_terms
+        ))
+
+        if self.document_index is not None:
+            with stage('update_document_index'):
+                self.document_index.update(
+                    current_results, current_feedback,
+                    lambda new_results: self.extract_words(new_results, query_terms)
+                )
+            statistics = self.document_index.statistics(query_terms)
+            rankings = None
+            context.provide('frequency_boost', statistics.frequency_boost)
+        elif self.ranking_engine == 'matrix':
+            # filtered words and the vocab in the results
+            with stage('extract_words'):
+                documents, vocab = self.extract_words(current_results, query_terms)
+            context.set('documents', documents)
+            with stage('construct_term_matrix'):
+                statistics = TermMatrix(documents, vocab, query_terms, current_feedback).statistics
+            rankings = None
+            context.provide('frequency_boost', statistics.frequency_boost)
+        else:
+            statistics = None
+            with stage('extract_words'):
+                documents, vocab = self.extract_words(current_results, query_terms)
+            context.set('documents', documents)
+            # Step 1: get the inverse lists for words
+            with stage('construct_inverse_list'):
+                inverse_list = self.construct_inverse_list(documents, vocab, query_terms)
+
+            # Step 2: candidate words to append in the query
+            with stage('get_words_to_search'):
+                words_to_search = self.get_words_to_search(
+                    current_feedback, vocab, query_terms, inverse_list
+                )
+            words_to_search.extend(query_terms) # We want to also rank the query terms for ordering
 
-        # Step 3: get gini rankings, enhanced by frequency and dependency weights
-        rankings = self.get_gini_rankings(
-            words_to_search, inverse_list, current_feedback
-        )
-        self.weigh_ranking_by_frequency(rankings, inverse_list, current_feedback)
-        self.weigh_ranking_by_dependency(
-            rankings, current_results, current_feedback, query_terms
-        )
+            # Step 3: get gini rankings, enhanced by the weighted features
+            with stage('gini_ranking'):
+                rankings = self.get_gini_rankings(
+                    words_to_search, inverse_list, current_feedback
+                )
+            context.provide('frequency_boost', lambda: self.inverse_list_frequency_boost(
+                inverse_list, current_feedback
+            ))
+
+        return {
+            'query_terms': query_terms,
+            'results': current_results,
+            'feedback': current_feedback,
+            'context': context,
+            'statistics': statistics,
+            'rankings': rankings,
+        }
+
+    def finish_augmentation(self, augmentation):
+        '''
+        Second half of augment_query: ranks the words, adds the weighted features and
+        returns the new query
+        '''
+        rankings = self.final_rankings(augmentation)
         # Step 4: Choose new words and the new order to append, return the new query
-        return self.get_new_query(rankings, current_results, current_feedback, query_terms)
+        with self.instrumentation.stage('get_new_query'):
+            return self.get_new_query(
+                rankings, augmentation['results'], augmentation['feedback'], augmentation['query_terms']
+            )
+
+    def final_rankings(self, augmentation):
+        '''
+        Gini rankings of the candidate words (and query terms) plus the weighted features
+        '''
+        rankings = augmentation['rankings']
+        if rankings is None:
+            rankings = self.rank_from_statistics(augmentation['statistics'], augmentation['query_terms'])
+
+        self.weigh_rankings(rankings, augmentation['context'])
+        return rankings
+
+    def save_parse_cache(self):
+        '''
+        Writes the parse cache to parse_cache_path if it has new parses. Called at the end of
+        a session, so the whole DocBin is not rewritten every round
+        '''
+        if self.loaded_parse_cache is not None and self.parse_cache_path is not None and self.parse_cache.dirty:
+            self.parse_cache.save()
+
+    def weigh_rankings(self, rankings, context):
+        '''
+        Adds weight * score of every ranking feature to the rankings. Features with a zero
+        weight are skipped along with the inputs only they need (e.g. the spaCy parses)
+        '''
+        for feature in self.features:
+            weight = getattr(self, feature.weight_attribute)
+            if weight == 0:
+                continue
+            with self.instrumentation.stage(f'{feature.name}_weighting'):
+                scores = feature.score(self, context.inputs_of(feature), rankings.keys())
+                for word in rankings.keys():
+                    rankings[word] += weight * scores[word]
 
     def extract_words(self, result_list, query_terms):
         """
@@ -57,47 +263,47 @@ class QueryAugmenter:
         """
         documents = []
         vocab = set()
-        for result in result_list:
-            title = result.get("Title", "")
-            snippet = result.get("Summary", "")
-            
-            title_words = re.findall(self.pattern, title.lower())
-            title_words = [
-                word.strip()
-                for word in title_words
-                if (word.strip() not in self.stop_words) # Filter all the stop words
-                or (word.strip() in query_terms) # Do not filter query terms
-            ]
-
-            snippet_words = re.findall(self.pattern, snippet.lower())
-            snippet_words = [
-                word.strip()
-                for word in snippet_words
-                if (word.strip() not in self.stop_words) # Filter all the stop words 
-                or (word.strip() in query_terms) # Do not filter query terms
-            ]
-            
+        # query terms are not filtered even if they are stop words
+        query_terms = set(query_terms)
+        for document in self.document_store.documents_of(result_list):
+            title_words, snippet_words = document.filtered(query_terms)
             vocab.update(title_words + snippet_words)
             documents.append({"title": title_words, "summary": snippet_words})
         return documents, vocab
 
-    def is_query_term_in_window(self, words, index, query_terms):
+    def close_to_query_flags(self, words, query_terms):
         """
-        takes a list of words, and an index. Returns true if any word of the query_terms is
-        within a window of the index parametrised by self.window_size
+        takes a list of words. Returns a list with, for every index, True if any word of the
+        query_terms (other than the word itself) is within a window of the index parametrised
+        by self.window_size. Uses the positions of the query terms in one pass each way.
         """
-        for i in range(index - self.window_size, index + self.window_size + 1):
-            if i < 0 or i >= len(words) or i == index:
-                continue
+        query_terms = set(query_terms)
+        n_words = len(words)
+        flags = [False] * n_words
+
+        # distance to the closest query term before each index
+        last_query_position = None
+        for i in range(n_words):
+            if last_query_position is not None and i - last_query_position <= self.window_size:
+                flags[i] = True
             if words[i] in query_terms:
-                return True
+                last_query_position = i
 
-        return False
+        # distance to the closest query term after each index
+        next_query_position = None
+        for i in range(n_words - 1, -1, -1):
+            if next_query_position is not None and next_query_position - i <= self.window_size:
+                flags[i] = True
+            if words[i] in query_terms:
+                next_query_position = i
+
+        return flags
 
     def construct_inverse_list(self, documents, vocab, query_terms):
         """
         Constructs inverse list which has entries of the form:
-        {word: {doc_i: {'frequency': int, 'close_to_query': True/False}}}
+        {word: {doc_i: {'frequency': int}}}
+        Closeness to the query terms is computed by proximity_counts, only for the relevant docs
         """
         # Intialise empty word_dicts for each word
         inverse_list = {word: {} for word in vocab}
@@ -106,26 +312,15 @@ class QueryAugmenter:
                 inverse_list[query_term] = {}
         for doc_i, document in enumerate(documents):
             # All the words in a document
-            # We append '\' as an extra character separating title and summary
-            doc_words = (
-                document["title"] + ["\\"] * self.window_size + document["summary"]
-            )
-
-            for word_i, word in enumerate(doc_words):
-                if word == "\\":
-                    continue
-
+            for word in document["title"] + document["summary"]:
                 # Get the word_dict associated with the word
                 word_dict = inverse_list[word]
                 if doc_i not in inverse_list[word]:
                     # If the word_dict does not have the current_document, initialise it
-                    word_dict[doc_i] = {"frequency": 0, "close_to_query": False}
+                    word_dict[doc_i] = {"frequency": 0}
 
-                # Update frequency and close_to_query
+                # Update frequency
                 word_dict[doc_i]["frequency"] = word_dict[doc_i]["frequency"] + 1
-                word_dict[doc_i]["close_to_query"] = self.is_query_term_in_window(
-                    doc_words, word_i, query_terms
-                )
 
         return inverse_list
 
@@ -203,12 +398,13 @@ class QueryAugmenter:
 
         return rankings
 
-    def weigh_ranking_by_frequency(self, rankings, inverse_list, feedback):
+    def inverse_list_frequency_boost(self, inverse_list, feedback):
         '''
-        Enhances the ranking of words based on frequency in relevant docs
+        Returns a function giving log(1+f) of a word, f being its frequency in relevant docs
         '''
         relevant_docs = set([i for i in range(len(feedback)) if feedback[i] == 1])
-        for word in rankings.keys():
+
+        def frequency_boost(word):
             word_docs = set(inverse_list[word].keys())
             relevant_word_docs = word_docs.intersection(relevant_docs)
 
@@ -217,62 +413,90 @@ class QueryAugmenter:
             for doc in relevant_word_docs:
                 total_relevant_freq += inverse_list[word][doc]['frequency']
 
-            # enhance ranking of the word by tf_word = log(1+f_word) 
-            rankings[word] += self.frequency_weight * log(1.0 + total_relevant_freq)
+            # tf_word = log(1+f_word)
+            return log(1.0 + total_relevant_freq)
+
+        return frequency_boost
+
+    def proximity_counts(self, documents, feedback, query_terms):
+        '''
+        Number of relevant docs in which each word appears within window_size of a query term
+        '''
+        counts = {}
+        for document, judgment in zip(documents, feedback):
+            if judgment != 1:
+                continue
+            doc_words = document["title"] + ["\\"] * self.window_size + document["summary"]
+            close_to_query = self.close_to_query_flags(doc_words, query_terms)
+            for word in set(word for word, close in zip(doc_words, close_to_query) if close):
+                counts[word] = counts.get(word, 0) + 1
+        return counts
+
+    def rank_from_statistics(self, statistics, query_terms):
+        '''
+        Steps 2-3 (gini only) on TermStatistics
+        '''
+        stage = self.instrumentation.stage
+        with stage('get_words_to_search'):
+            words_to_search, self.k = statistics.get_words_to_search(query_terms, self.k)
+        words_to_search.extend(query_terms) # We want to also rank the query terms for ordering
+
+        with stage('gini_ranking'):
+            rankings = statistics.get_gini_rankings(words_to_search)
+        return rankings
 
     def has_query_terms(self, term_list, query_terms):
         '''
         Returns true if a term_list has any word from query_terms.
         '''
         for term in term_list:
-            if term.lower().strip() in query_terms:
+            if term in query_terms:
                 return True
         return False
 
-    def weigh_ranking_by_dependency(self, rankings, results, feedback, query_terms):
+    def relevant_summaries(self, results, feedback):
         '''
-        Uses dependency parsing, and adds weightage to all the words that are related to 
-        the query terms syntactically.  
+        Summaries of the relevant results
+        '''
+        return [results[i]["Summary"] for i in range(len(feedback)) if feedback[i] == 1]
+
+    def parse_relevant_summaries(self, results, feedback):
+        '''
+        spaCy parses of the summaries of the relevant results
+        '''
+        return self.parse_cache.parse(self.relevant_summaries(results, feedback))
+
+    def dependency_counts(self, docs, words, query_terms):
+        '''
+        Uses dependency parsing, and counts for all the words how often they are related to
+        the query terms syntactically.
         '''
-        # all the relevant result blocks
-        relevant_results = [
-            results[i] for i in range(len(feedback)) if feedback[i] == 1
-        ]
         # initialise the freq of occurence of a word in a dependency to query terms as 0
-        freq_of_dependency_occurence = {i: 0 for i in rankings.keys()}
-
-        for result in relevant_results:
-            doc = self.nlp(result["Summary"])
-            for token in doc:
-                # all the text in token
-                token_text = list(re.findall(self.pattern, token.text))
-                
+        freq_of_dependency_occurence = {i: 0 for i in words}
+
+        query_terms = set(query_terms)
+
+        for doc in docs:
+            # words in the text of every token, each token is tokenized once
+            words_of_tokens = [self.tokenizer.tokenize(token.text) for token in doc]
+            for token, token_text in zip(doc, words_of_tokens):
                 # all the text in children of token
                 token_children = []
                 for child in token.children:
-                    token_children.extend(list(re.findall(self.pattern, child.text)))
+                    token_children.extend(words_of_tokens[child.i])
 
                 # if token_text has any query term, increase the frequency of all dependent children
-                if self.has_query_terms(token_text, query_terms):
-                    for word in token_children:
-                        if word.lower().strip() not in rankings:
-                            continue
-                        freq_of_dependency_occurence[word.lower().strip()] += 1.0
-                # if token is a root token, and children has any query term, 
+                # if token is a root token, and children has any query term,
                 # increase the frequency of all children
-                elif token.dep_ == "ROOT" and self.has_query_terms(
-                    token_children, query_terms
+                if self.has_query_terms(token_text, query_terms) or (
+                    token.dep_ == "ROOT" and self.has_query_terms(token_children, query_terms)
                 ):
                     for word in token_children:
-                        if word.lower().strip() not in rankings:
+                        if word not in freq_of_dependency_occurence:
                             continue
-                        freq_of_dependency_occurence[word.lower().strip()] += 1.0
+                        freq_of_dependency_occurence[word] += 1.0
 
-        # enhance the rankings of all words by log(1+d_word)
-        for word in rankings.keys():
-            rankings[word] += self.dependency_weight * log(
-                1.0 + freq_of_dependency_occurence[word]
-            )
+        return freq_of_dependency_occurence
 
 
     def get_new_query(self, rankings, current_results, current_feedback, current_query_terms):
@@ -280,16 +504,8 @@ class QueryAugmenter:
         Takes rankings and current_query_terms to generate a new query by choosing new
         words to append and the ordering of the new query. Uses subsequence counts for reordering.
         """
-        # Keep a track of relevant results
-        relevant_results = []
-        # We need the combined string of relevant documents
-        for i in range(len(current_results)):
-            if current_feedback[i] == 1:
-                result = current_results[i]
-                final_string = result['Title'] + '' + result['Summary']
-                final_words  = [w.strip().lower() for w in re.findall(self.pattern, final_string)]
-                final_string = " ".join(final_words)
-                relevant_results.append(final_string)
+        # We need the words (title followed by summary) of relevant documents
+        relevant_results = self.relevant_words(current_results, current_feedback)
 
         # Initial query terms have to be included in the new query
         new_query_terms = [term for term in current_query_terms]
@@ -308,13 +524,74 @@ class QueryAugmenter:
             new_query_terms.append(candidates[0])
 
         # Reorder the new query terms using the order with the highest subsequence count
-        reordered_terms = self.reorder(new_query_terms, relevant_results)
+        with self.instrumentation.stage('reorder'):
+            reordered_terms = self.reorder(new_query_terms, relevant_results)
 
         return " ".join(reordered_terms), appended_terms
     
-    def reorder(self, terms, original_relevant_docs):
+    def get_new_queries(self, rankings, current_results, current_feedback, current_query_terms, n_candidates):
+        """
+        Up to n_candidates (new query, appended terms) for exploration. The first is the query
+        of get_new_query, then its terms in their original order, then the other single terms
+        and pairs among the top candidates, by the mean ranking of their appended terms.
+        """
+        new_queries = [self.get_new_query(rankings, current_results, current_feedback, current_query_terms)]
+        appended_terms = new_queries[0][1]
+        appended_terms = list(appended_terms) if isinstance(appended_terms, tuple) else [appended_terms]
+        new_queries.append((" ".join(list(current_query_terms) + appended_terms), new_queries[0][1]))
+
+        possible_append_terms = [term for term in rankings.keys() if term not in current_query_terms]
+        candidates = sorted(possible_append_terms, key=lambda x: -rankings[x])[:n_candidates]
+        expansions = [(term,) for term in candidates] + list(combinations(candidates, 2))
+        # sorted is stable, so a single term goes before the pairs with the same mean ranking
+        expansions = sorted(expansions, key=lambda terms: -sum(rankings[term] for term in terms) / len(terms))
+
+        relevant_results = self.relevant_words(current_results, current_feedback)
+        for terms in expansions:
+            # enough to fill n_candidates after the repeated queries are dropped
+            if len(new_queries) >= 2 * n_candidates:
+                break
+            reordered_terms = self.reorder(list(current_query_terms) + list(terms), relevant_results)
+            new_queries.append((" ".join(reordered_terms), terms[0] if len(terms) == 1 else terms))
+
+        unique_queries = {}
+        for new_query, appended in new_queries:
+            unique_queries.setdefault(new_query, appended)
+        return list(unique_queries.items())[:n_candidates]
+
+    def relevant_words(self, results, feedback):
+        return [
+            self.document_store.document(results[i]).words
+            for i in range(len(results)) if feedback[i] == 1
+        ]
+
+    def reorder(self, terms, relevant_docs):
+        """
+        Reorders terms based on their subsequence count in relevant documents (lists of words).
+        """
+        if self.reorder_mode == 'regex':
+            return self.reorder_by_regex(terms, [" ".join(doc) for doc in relevant_docs])
+
+        reordered_terms = self.ordering_engine.best_order(terms, relevant_docs)
+
+        if self.reorder_mode == 'check' and len(terms) <= self.check_limit:
+            original_relevant_docs = [" ".join(doc) for doc in relevant_docs]
+            # the regex matches substrings of words, so the orders may legitimately differ;
+            # we only count a mismatch when the regex scores them differently
+            regex_terms = self.reorder_by_regex(terms, original_relevant_docs)
+            regex_score = lambda order: sum(
+                self.subsequence_count_of_order(order, doc) for doc in original_relevant_docs
+            )
+            if regex_score(reordered_terms) != regex_score(regex_terms):
+                self.reorder_mismatches += 1
+                self.instrumentation.count('reorder_mismatches')
+            return regex_terms
+
+        return reordered_terms
+
+    def reorder_by_regex(self, terms, original_relevant_docs):
         """
-        Reorders terms based on their subsequence count in original relevant documents.
+        Reorders terms by trying every permutation and counting its occurences with a regex.
         """
         orders = []
 
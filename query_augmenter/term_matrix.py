@@ -0,0 +1,185 @@
+from math import log
+import numpy
+
+
+class TermMatrix:
+    '''
+    Vectorized alternative to the inverse list. Holds the (word, document) pair of every
+    token as flat arrays and a relevance vector, and gets the document frequency, relevant
+    document frequency and relevant term frequency of the whole vocab with bincount, so
+    gini gain, the relevant-doc ratio and the log-frequency boost are a few array operations.
+    The word x document matrix itself is never built, only these per-word aggregates are read.
+    '''
+    def __init__(self, documents, vocab, query_terms, feedback):
+        # rows follow the iteration order of vocab so that ties are broken exactly
+        # like the inverse-list path, query terms that are not in the results go last
+        self.words = list(vocab)
+        for query_term in query_terms:
+            if query_term not in vocab and query_term not in self.words:
+                self.words.append(query_term)
+        self.word_index = {word: i for i, word in enumerate(self.words)}
+
+        # every token, and every distinct word of a document (which the document frequencies count once)
+        token_words, token_lengths, pair_words, pair_lengths = [], [], [], []
+        for document in documents:
+            ids = list(map(self.word_index.__getitem__, document["title"] + document["summary"]))
+            token_words.extend(ids)
+            token_lengths.append(len(ids))
+            distinct_ids = set(ids)
+            pair_words.extend(distinct_ids)
+            pair_lengths.append(len(distinct_ids))
+        document_numbers = numpy.arange(len(documents))
+        self.token_words = numpy.fromiter(token_words, dtype=numpy.int64, count=len(token_words))
+        self.token_documents = numpy.repeat(document_numbers, token_lengths)
+        pair_words = numpy.fromiter(pair_words, dtype=numpy.int64, count=len(pair_words))
+        pair_documents = numpy.repeat(document_numbers, pair_lengths)
+
+        n_words = len(self.words)
+        self.relevance = numpy.array(feedback, dtype=numpy.int64) == 1
+        self.statistics = TermStatistics(
+            self.words,
+            doc_freq=numpy.bincount(pair_words, minlength=n_words),
+            relevant_doc_freq=numpy.bincount(pair_words[self.relevance[pair_documents]], minlength=n_words),
+            relevant_term_freq=numpy.bincount(
+                self.token_words[self.relevance[self.token_documents]], minlength=n_words
+            ),
+            n_documents=len(feedback),
+            n_relevant=int(self.relevance.sum()),
+        )
+
+
+class TermStatistics:
+    '''
+    Per-word document statistics that all the ranking stages need. Gini gain, the ratio
+    filter and the frequency boost only depend on these aggregates, so the same code
+    ranks words from a TermMatrix or from any other source of counts.
+    '''
+    def __init__(self, words, doc_freq, relevant_doc_freq, relevant_term_freq, n_documents, n_relevant):
+        self.words = words
+        self.word_index = {word: i for i, word in enumerate(words)}
+        self.doc_freq = numpy.asarray(doc_freq, dtype=numpy.int64)
+        self.relevant_doc_freq = numpy.asarray(relevant_doc_freq, dtype=numpy.int64)
+        self.relevant_term_freq = numpy.asarray(relevant_term_freq, dtype=numpy.int64)
+        self.n_documents = n_documents
+        self.n_relevant = n_relevant
+        # set by gini_gains, or for many statistics at once by batch_gini_gains
+        self.cached_gini_gains = None
+
+    @staticmethod
+    def gini(n_relevant_docs, n_irrelevant_docs):
+        '''
+        Same formula as QueryAugmenter.gini, for arrays of counts. Gini only depends on
+        the pair of counts, so it is evaluated once per distinct pair with python floats
+        (numpy squares differently from pow and would not match the inverse-list path)
+        '''
+        eps = 1e-7
+        pairs = numpy.stack([n_relevant_docs, n_irrelevant_docs], axis=1)
+        unique_pairs, inverse = numpy.unique(pairs, axis=0, return_inverse=True)
+        ginis = numpy.empty(len(unique_pairs))
+        for i, (n_relevant, n_irrelevant) in enumerate(unique_pairs.tolist()):
+            p_relevance = n_relevant / (n_irrelevant + n_relevant + eps)
+            p_irrelevance = n_irrelevant / (n_irrelevant + n_relevant + eps)
+            ginis[i] = 1 - p_irrelevance**2 - p_relevance**2
+        return ginis[inverse.reshape(-1)]
+
+    def gini_gains(self):
+        '''
+        Gini gain of every word, in the order of self.words
+        '''
+        if self.cached_gini_gains is None:
+            self.cached_gini_gains = self.compute_gini_gains(
+                self.doc_freq, self.relevant_doc_freq, self.n_documents, self.n_relevant
+            )
+        return self.cached_gini_gains
+
+    @classmethod
+    def batch_gini_gains(cls, statistics_list):
+        '''
+        Computes the gini gains of many TermStatistics with one set of array operations over
+        their stacked words. The gains are identical to computing them one by one
+        '''
+        statistics_list = [statistics for statistics in statistics_list if statistics.cached_gini_gains is None]
+        if not statistics_list:
+            return
+        lengths = [len(statistics.words) for statistics in statistics_list]
+        # the document counts are repeated for every word of their statistics
+        gains = cls.compute_gini_gains(
+            numpy.concatenate([statistics.doc_freq for statistics in statistics_list]),
+            numpy.concatenate([statistics.relevant_doc_freq for statistics in statistics_list]),
+            numpy.repeat([statistics.n_documents for statistics in statistics_list], lengths),
+            numpy.repeat([statistics.n_relevant for statistics in statistics_list], lengths),
+        )
+        for statistics, statistics_gains in zip(statistics_list, numpy.split(gains, numpy.cumsum(lengths)[:-1])):
+            statistics.cached_gini_gains = statistics_gains
+
+    @classmethod
+    def compute_gini_gains(cls, doc_freq, relevant_doc_freq, n_documents, n_relevant):
+        # n_documents and n_relevant are numbers, or arrays with a value per word
+        n_relevant_with_word = relevant_doc_freq
+        n_irrelevant_with_word = doc_freq - n_relevant_with_word
+        n_relevant_without_word = n_relevant - n_relevant_with_word
+        n_irrelevant_without_word = (n_documents - doc_freq) - n_relevant_without_word
+
+        w1 = doc_freq / n_documents
+        w2 = 1.0 - w1
+
+        # the base gini only depends on the document counts, so it is computed once per distinct pair
+        base_gini = cls.gini(
+            numpy.atleast_1d(n_relevant), numpy.atleast_1d(n_documents - n_relevant)
+        )
+        base_gini = base_gini[0] if numpy.ndim(n_relevant) == 0 else base_gini
+        word_gini = w1 * cls.gini(n_relevant_with_word, n_irrelevant_with_word) \
+                    + w2 * cls.gini(n_relevant_without_word, n_irrelevant_without_word)
+        return base_gini - word_gini
+
+    def relevant_ratios(self):
+        '''
+        Ratio of relevant docs to all docs containing the word. Words that are in no
+        document (query terms missing from the results) get a ratio of 0
+        '''
+        return numpy.divide(
+            self.relevant_doc_freq, self.doc_freq,
+            out=numpy.zeros(len(self.words)), where=self.doc_freq > 0,
+        )
+
+    def frequency_boosts(self):
+        '''
+        log(1 + f) of the frequency of every word in relevant docs. The logs come from a
+        table built with math.log so the values match the inverse-list path bit for bit
+        '''
+        max_freq = int(self.relevant_term_freq.max()) if len(self.words) else 0
+        log_table = numpy.array([log(1.0 + f) for f in range(max_freq + 1)])
+        return log_table[self.relevant_term_freq]
+
+    def get_words_to_search(self, query_terms, k):
+        '''
+        Returns (words_to_search, k). Mirrors QueryAugmenter.get_words_to_search, lowering
+        k by 0.1 until at least 2 words pass the ratio filter.
+        '''
+        ratios = self.relevant_ratios()
+        is_candidate = numpy.array([word not in query_terms for word in self.words], dtype=bool)
+        # lowering k can never select words that are in no document
+        if numpy.count_nonzero(is_candidate & (self.doc_freq > 0)) < 2:
+            raise ValueError("the results have fewer than 2 words that can be appended to the query")
+        while True:
+            selected = numpy.flatnonzero(is_candidate & (ratios >= k))
+            if len(selected) >= 2:
+                return [self.words[i] for i in selected], k
+            k = k - 0.1
+
+    def get_gini_rankings(self, words_to_search):
+        '''
+        returns gini rankings of words in words_to_search
+        '''
+        gains = self.gini_gains()
+        rankings = {}
+        for word in words_to_search:
+            rankings[word] = float(gains[self.word_index[word]])
+        return rankings
+
+    def frequency_boost(self):
+        '''
+        Returns a function giving log(1 + frequency in relevant docs) of a word
+        '''
+        boosts = self.frequency_boosts()
+        return lambda word: float(boosts[self.word_index[word]])
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+import regex as re
+
+
+class Tokenizer:
+    '''
+    Word tokenizer shared by every augmentation stage. The pattern is compiled once and
+    matches words without the leading space, so tokens need no strip(), and text is
+    lowercased once before matching instead of lowercasing every token.
+    '''
+    PATTERN = r"’s|’t|’re|’ve|’m|’ll|’d|\w+"
+
+    def __init__(self):
+        self.pattern = re.compile(self.PATTERN)
+
+    def __repr__(self) -> str:
+        return f'Tokenizer(pattern={self.PATTERN!r})'
+
+    def tokenize(self, text):
+        '''
+        Returns the lowercase words of text
+        '''
+        return self.pattern.findall(text.lower())
+
+
+class TokenizedDocument:
+    '''
+    A result tokenized once: the lowercase words of the title followed by the summary, the
+    boundary between the two fields and the stop word mask
+    '''
+    __slots__ = ('words', 'title_length', 'stop_mask')
+
+    def __init__(self, words, title_length, stop_mask):
+        self.words = words
+        self.title_length = title_length
+        self.stop_mask = stop_mask
+
+    def __repr__(self) -> str:
+        return f'TokenizedDocument(words={len(self.words)}, title_length={self.title_length})'
+
+    def filtered(self, query_terms):
+        '''
+        (title, summary) without stop words, query_terms (a set) are kept even if they are stop words
+        '''
+        title, summary = [], []
+        for i, (word, is_stop) in enumerate(zip(self.words, self.stop_mask)):
+            if not is_stop or word in query_terms:
+                (title if i < self.title_length else summary).append(word)
+        return title, summary
+
+
+class DocumentStore:
+    '''
+    LRU cache of TokenizedDocuments keyed by the title and summary of a result, so a
+    result is tokenized once however many stages (and rounds) read it
+    '''
+    def __init__(self, stop_words, tokenizer=None, max_size=4096):
+        self.tokenizer = tokenizer if tokenizer is not None else Tokenizer()
+        self.stop_words = stop_words
+        self.max_size = max_size
+        self.documents = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # the prefetcher reads documents from a background thread as well
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'DocumentStore(documents={len(self.documents)}, hits={self.hits}, misses={self.misses})'
+
+    def document(self, result):
+        '''
+        The TokenizedDocument of a result dict with "Title" and "Summary" keys
+        '''
+        title = result.get("Title", "")
+        summary = result.get("Summary", "")
+        key = (title, summary)
+        with self.lock:
+            document = self.documents.get(key)
+            if document is not None:
+                self.hits += 1
+                self.documents.move_to_end(key)
+                return document
+
+            self.misses += 1
+            title_words = self.tokenizer.tokenize(title)
+            words = title_words + self.tokenizer.tokenize(summary)
+            stop_words = self.stop_words
+            document = TokenizedDocument(words, len(title_words), [word in stop_words for word in words])
+            self.documents[key] = document
+            while len(self.documents) > self.max_size:
+                self.documents.popitem(last=False)
+            return document
+
+    def documents_of(self, results):
+        return [self.document(result) for result in results]
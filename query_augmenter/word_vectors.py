@@ -0,0 +1,62 @@
+import threading
+
+import numpy
+
+
+class WordVectors:
+    '''
+    Unit length static vectors of words, looked up in a spaCy vocab once and kept across
+    rounds in one matrix. Words without a vector get a zero row, so their cosine similarity
+    with anything is 0.
+    '''
+    def __init__(self, vocab, initial_capacity=1024):
+        self.vocab = vocab
+        self.width = vocab.vectors_length
+        self.rows = {}
+        self.matrix = numpy.zeros((initial_capacity, self.width), dtype=numpy.float32)
+        # the prefetcher and the augmentation service look up vectors from several threads
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'WordVectors(words={len(self.rows)}, width={self.width})'
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row_ids(self, words):
+        '''
+        Rows of words in the matrix, looking up the words seen for the first time
+        '''
+        with self.lock:
+            ids = []
+            for word in words:
+                row = self.rows.get(word)
+                if row is None:
+                    row = len(self.rows)
+                    if row == len(self.matrix):
+                        # capacity doubles, so adding words is amortized constant time
+                        self.matrix = numpy.concatenate([self.matrix, numpy.zeros_like(self.matrix)])
+                    if self.vocab.has_vector(word):
+                        vector = numpy.asarray(self.vocab.get_vector(word), dtype=numpy.float32)
+                        norm = numpy.linalg.norm(vector)
+                        if norm > 0:
+                            self.matrix[row] = vector / norm
+                    self.rows[word] = row
+                ids.append(row)
+            return numpy.array(ids, dtype=numpy.int64)
+
+    def unit_vectors(self, words):
+        '''
+        (len(words), width) matrix of the unit vectors of words
+        '''
+        ids = self.row_ids(words)
+        return self.matrix[ids]
+
+    def centroid(self, documents):
+        '''
+        Mean over documents (lists of words) of the mean unit vector of their words
+        '''
+        document_vectors = [self.unit_vectors(words).mean(axis=0) for words in documents if words]
+        if not document_vectors:
+            return numpy.zeros(self.width, dtype=numpy.float32)
+        return numpy.mean(document_vectors, axis=0)
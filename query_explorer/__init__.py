@@ -0,0 +1 @@
+from .explorer import QueryExplorer
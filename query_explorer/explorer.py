@@ -0,0 +1,130 @@
+import asyncio
+from collections import Counter
+from math import sqrt
+
+from instrumentation import NULL_INSTRUMENTATION
+
+
+class QueryExplorer:
+    '''
+    Explores several candidate queries before showing a round. The augmenter builds the top
+    n_candidates expansions and orderings, their results are fetched concurrently, and every
+    page is scored as soon as it arrives by a pseudo-relevance model: results already judged
+    keep their judgment, the others score their cosine similarity with the words of the
+    relevant documents (of the session index, or else of the last round). The best page
+    found within latency_budget seconds is shown.
+
+    The query augment_query would pick is always a candidate and wins ties; if no page is
+    ready within the budget, its page is awaited. Every candidate costs an API request.
+    '''
+    def __init__(self, qm, qa, n_candidates=3, latency_budget=3.0, instrumentation=None):
+        self.qm = qm
+        self.qa = qa
+        self.n_candidates = n_candidates
+        self.latency_budget = latency_budget
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        self.rounds = 0
+        # rounds where another candidate beat the query augment_query picks
+        self.switches = 0
+        # candidates dropped because they failed or were not ready within the budget
+        self.dropped = 0
+
+    def __repr__(self) -> str:
+        return f'QueryExplorer(n_candidates={self.n_candidates}, latency_budget={self.latency_budget}, rounds={self.rounds}, switches={self.switches})'
+
+    def explore(self, current_query, current_results, current_feedback):
+        '''
+        sync wrapper around aexplore
+        '''
+        return asyncio.run(self.aexplore(current_query, current_results, current_feedback))
+
+    async def aexplore(self, current_query, current_results, current_feedback):
+        '''
+        Returns (new query, appended terms, results) of the best candidate
+        '''
+        self.rounds += 1
+        with self.instrumentation.stage('explore.candidates'):
+            candidates = self.qa.augment_candidates(
+                current_query, current_results, current_feedback, self.n_candidates
+            )
+        query_terms = self.qa.tokenizer.tokenize(current_query)
+        # the session index already includes this round, augment_candidates updated it
+        profile = self.relevance_profile(current_results, current_feedback, query_terms)
+        judgments = self.judgments(current_results, current_feedback)
+
+        tasks = [
+            asyncio.ensure_future(self.fetch_and_score(new_query, profile, judgments, query_terms))
+            for new_query, _ in candidates
+        ]
+        with self.instrumentation.stage('explore.fetch_and_score'):
+            done, pending = await asyncio.wait(tasks, timeout=self.latency_budget)
+            if not any(task in done and task.exception() is None for task in tasks) and tasks[0] in pending:
+                # nothing to show yet, the default query is awaited past the budget
+                await asyncio.wait([tasks[0]])
+                pending.discard(tasks[0])
+        for task in pending:
+            task.cancel()
+
+        scored = [
+            (task.result()[1], -i, i) for i, task in enumerate(tasks)
+            if task.done() and not task.cancelled() and task.exception() is None
+        ]
+        self.dropped += len(tasks) - len(scored)
+        if not scored:
+            # every candidate failed, the error of the default query is raised
+            raise tasks[0].exception()
+        _, _, best = max(scored)
+        if best != 0:
+            self.switches += 1
+            self.instrumentation.count('explore.switches')
+        new_query, appended_terms = candidates[best]
+        return new_query, appended_terms, tasks[best].result()[0]
+
+    async def fetch_and_score(self, new_query, profile, judgments, query_terms):
+        results = await self.qm.aquery(new_query)
+        # scoring tokenizes the page, so it runs off the event loop while other pages are fetched
+        loop = asyncio.get_running_loop()
+        score = await loop.run_in_executor(None, self.score, results, profile, judgments, query_terms)
+        return results, score
+
+    def relevance_profile(self, current_results, current_feedback, query_terms):
+        '''
+        Counter of the words of the relevant documents
+        '''
+        index = self.qa.document_index
+        if index is not None:
+            return Counter({
+                word: int(frequency)
+                for word, frequency in zip(index.words, index.relevant_term_freq[:len(index.words)])
+                if frequency > 0
+            })
+        relevant_results = [result for result, judgment in zip(current_results, current_feedback) if judgment == 1]
+        documents, _ = self.qa.extract_words(relevant_results, query_terms)
+        return Counter(word for document in documents for word in document['title'] + document['summary'])
+
+    def judgments(self, current_results, current_feedback):
+        # URL -> judgment of every result judged in the session
+        judgments = {}
+        if self.qa.document_index is not None:
+            judgments.update({url: document['judgment'] for url, document in self.qa.document_index.documents.items()})
+        judgments.update({result['URL']: judgment for result, judgment in zip(current_results, current_feedback)})
+        return judgments
+
+    def score(self, results, profile, judgments, query_terms):
+        '''
+        Mean pseudo-relevance of a page of results
+        '''
+        if not results:
+            return 0.0
+        profile_norm = sqrt(sum(frequency * frequency for frequency in profile.values()))
+        documents, _ = self.qa.extract_words(results, query_terms)
+        total = 0.0
+        for result, document in zip(results, documents):
+            if result['URL'] in judgments:
+                total += judgments[result['URL']]
+                continue
+            counts = Counter(document['title'] + document['summary'])
+            norm = sqrt(sum(count * count for count in counts.values()))
+            if norm > 0 and profile_norm > 0:
+                total += sum(count * profile[word] for word, count in counts.items()) / (norm * profile_norm)
+        return total / len(results)
@@ -1 +1,15 @@
-from .query_manager import QueryManager
\ No newline at end of file
+from .query_manager import QueryManager
+from .near_duplicates import NearDuplicateFilter
+from .response_cache import ResponseCache
+from .search_client import AsyncSearchClient
+from .exceptions import (
+    QueryError,
+    QueryTimeoutError,
+    QueryConnectionError,
+    QueryHTTPError,
+    QueryRateLimitError,
+    QueryParseError,
+    QueryResultsError,
+    OfflineCacheMissError,
+    QuotaExceededError,
+)
@@ -0,0 +1,44 @@
+class QueryError(Exception):
+    '''
+    Base class of all the errors raised while querying the search API
+    '''
+
+
+class QueryTimeoutError(QueryError):
+    pass
+
+
+class QueryConnectionError(QueryError):
+    pass
+
+
+class QueryHTTPError(QueryError):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class QueryRateLimitError(QueryHTTPError):
+    '''
+    429 from the API, raised once the retries are used up
+    '''
+
+
+class QueryParseError(QueryError):
+    pass
+
+
+class QueryResultsError(QueryError):
+    '''
+    The response is valid but does not have the results we need
+    '''
+
+
+class OfflineCacheMissError(QueryError):
+    pass
+
+
+class QuotaExceededError(QueryError):
+    '''
+    The daily quota of API requests is used up, raised by the query_scheduler before sending
+    '''
@@ -0,0 +1,94 @@
+import re
+import zlib
+
+import numpy
+
+# universal hashing (a * x + b) mod a prime, the products fit in 64 bits
+PRIME = (1 << 31) - 1
+WORD_PATTERN = re.compile(r'\w+')
+
+
+class NearDuplicateFilter:
+    '''
+    Finds near-duplicate results (mirrored or syndicated pages) by the Jaccard similarity of
+    the word shingles of their title and snippet. Every result gets a MinHash signature of
+    num_perm hashes, and locality sensitive hashing over bands of the signature only compares
+    results that share a band, so the cost grows with the number of results and not with the
+    number of pairs. A near duplicate is folded into the most similar earlier result, the
+    highest ranked one on ties.
+    '''
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=3, seed=1):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        random_state = numpy.random.RandomState(seed)
+        self.a = random_state.randint(1, PRIME, size=num_perm, dtype=numpy.int64)
+        self.b = random_state.randint(0, PRIME, size=num_perm, dtype=numpy.int64)
+
+    def __repr__(self) -> str:
+        return f'NearDuplicateFilter(threshold={self.threshold}, num_perm={self.num_perm}, bands={self.bands}, shingle_size={self.shingle_size})'
+
+    def shingles(self, text):
+        words = WORD_PATTERN.findall(text.lower())
+        # texts shorter than a shingle are one shingle
+        size = min(self.shingle_size, len(words)) or 1
+        return {' '.join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+    def signature(self, text):
+        # crc32 is stable across processes, unlike hash()
+        hashes = numpy.array([zlib.crc32(shingle.encode()) % PRIME for shingle in self.shingles(text)],
+                             dtype=numpy.int64)
+        return ((numpy.outer(hashes, self.a) + self.b) % PRIME).min(axis=0)
+
+    def similarity(self, signature, other):
+        '''
+        Estimated Jaccard similarity of two signatures
+        '''
+        return float(numpy.count_nonzero(signature == other)) / self.num_perm
+
+    def index(self):
+        return DuplicateIndex(self)
+
+
+class DuplicateIndex:
+    '''
+    LSH index of the representatives kept so far, for one query (across its result pages)
+    '''
+    def __init__(self, duplicate_filter):
+        self.filter = duplicate_filter
+        # (band number, band hashes) -> representatives sharing that band
+        self.buckets = {}
+
+    def __repr__(self) -> str:
+        return f'DuplicateIndex(filter={self.filter}, buckets={len(self.buckets)})'
+
+    def add(self, key, text):
+        '''
+        Returns the key (rank) of the most similar representative if text is a near duplicate of it,
+        otherwise keeps key as a representative and returns None
+        '''
+        signature = self.filter.signature(text)
+        rows = self.filter.rows
+        bands = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.filter.bands)]
+
+        best, best_similarity = None, 0.0
+        seen = set()
+        for band in bands:
+            for candidate_key, candidate_signature in self.buckets.get(band, ()):
+                if candidate_key in seen:
+                    continue
+                seen.add(candidate_key)
+                similarity = self.filter.similarity(signature, candidate_signature)
+                # ties go to the first, highest ranked, representative
+                if similarity >= self.filter.threshold and (best is None or (similarity, -candidate_key) > (best_similarity, -best)):
+                    best, best_similarity = candidate_key, similarity
+        if best is not None:
+            return best
+
+        for band in bands:
+            self.buckets.setdefault(band, []).append((key, signature))
+        return None
@@ -1,13 +1,29 @@
-import requests
-import sys
+import asyncio
+from instrumentation import NULL_INSTRUMENTATION
+from .exceptions import OfflineCacheMissError, QueryResultsError
+from .near_duplicates import NearDuplicateFilter
+from .response_cache import ResponseCache
+from .search_client import AsyncSearchClient, MAX_START, PAGE_SIZE
 
 class QueryManager:
 
     # initializing object constructor with required parameters
-    def __init__(self, API_KEY, engine_id, number_of_results = 10, feature_mapping = None):
+    def __init__(self, API_KEY, engine_id, number_of_results = 10, feature_mapping = None, cache = None, client = None, instrumentation = None, scheduler = None, priority = 'interactive', duplicate_threshold = None, backfill = False):
         self.API_KEY = API_KEY
         self.engine_id = engine_id
         self.number_of_results = number_of_results
+        # optional ResponseCache for the raw API responses
+        self.cache = cache
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        # optional query_scheduler.QueryScheduler shared with other sessions: it rate limits the
+        # requests of the default client and coalesces identical requests in flight.
+        # priority is the default priority of this manager's requests in the scheduler queue
+        self.scheduler = scheduler
+        self.priority = priority
+        # with a duplicate_threshold, near-duplicate results are collapsed into the first of them,
+        # and with backfill the results are topped up from the next pages
+        self.duplicate_filter = NearDuplicateFilter(duplicate_threshold) if duplicate_threshold is not None else None
+        self.backfill = backfill
         if feature_mapping is not None:
             self.feature_mapping = feature_mapping
         else: 
@@ -15,59 +31,129 @@ class QueryManager:
             self.feature_mapping = {'link': 'URL',
                                     'title': 'Title',
                                     'snippet': 'Summary'}
+        # partial response, the API only sends the mapped features of each item
+        self.fields = f"items({','.join(self.feature_mapping)})"
+        # the client does the HTTP requests, pass one to change timeouts, retries or the API url
+        self.client = client if client is not None else AsyncSearchClient(
+            API_KEY, engine_id, instrumentation=self.instrumentation, scheduler=scheduler, fields=self.fields
+        )
     
     def __repr__(self) -> str:
-        return f'\nQueryManager(API_KEY={self.API_KEY}, engine_id={self.engine_id},\n number_of_results = {self.number_of_results}, feature_mapping = {self.feature_mapping})'
+        return f'\nQueryManager(API_KEY={self.API_KEY}, engine_id={self.engine_id},\n number_of_results = {self.number_of_results}, feature_mapping = {self.feature_mapping}, cache = {self.cache})'
     
-    def query(self, query):
-        search_string = f'https://www.googleapis.com/customsearch/v1?key={self.API_KEY}&cx={self.engine_id}&q={query}' 
-        
-        try:
-            response = requests.get(search_string)
-            search_results =  response.json()
-            # verifying search results as per instructions mentioned in the homework description
-            self.__verify_results(search_results)
-            items = self.__parse_results(search_results)
-            return items
-        
-        # chekcing for all other types of errors in case of using requests.get()
-        except requests.exceptions.Timeout:
-            print("QUERY ERROR: Timeout occured")
-            sys.exit()
-        except requests.exceptions.TooManyRedirects:
-            print("QUERY ERROR: Too many redirects")
-            sys.exit()
-        except requests.exceptions.JSONDecodeError:
-            print("QUERY ERROR: JSON response can't be parsed")
-            sys.exit()
-        except requests.exceptions.RequestException:
-            print("QUERY ERROR: Connection error")
-            sys.exit()
+    def query(self, query, priority = None):
+        '''
+        sync wrapper around aquery, raises a QueryError if the query fails
+        '''
+        return asyncio.run(self.aquery(query, priority))
+
+    async def aquery(self, query, priority = None):
+        priority = priority if priority is not None else self.priority
+        # the pages needed for number_of_results are fetched concurrently and merged in rank order
+        with self.instrumentation.stage('query.fetch'):
+            pages = await asyncio.gather(*[
+                self.__fetch_page(query, start, priority) for start in self.client.page_starts(self.number_of_results)
+            ])
+        search_results = self.__merge_pages(pages)
+        # verifying search results as per instructions mentioned in the homework description
+        self.__verify_results(search_results)
+        with self.instrumentation.stage('query.parse_results'):
+            # taking the first 10 results only
+            items = self.__parse_results(search_results['items'][:self.number_of_results])
+        if self.duplicate_filter is not None:
+            items = await self.__collapse_duplicates(query, items, priority)
+        return items
+
+    def close(self):
+        self.client.close()
+
+    async def __fetch_page(self, query, start, priority):
+        # the cache, when there is one, decides whether the API is called at all. Responses
+        # only hold the requested fields, so the fields are part of the key
+        if self.cache is not None and self.cache.mode != 'record':
+            search_results = self.cache.get(query, self.engine_id, start=start, fields=self.fields)
+            if search_results is not None:
+                self.instrumentation.count('query.cache_hits')
+                return search_results
+            if self.cache.mode == 'offline':
+                raise OfflineCacheMissError("Query not found in the offline cache")
+
+        if self.scheduler is not None:
+            # identical pages requested at the same time (e.g. a prefetch and the real round) are sent once
+            search_results = await self.scheduler.coalesce(
+                ResponseCache.key(query, self.engine_id, start=start, fields=self.fields),
+                lambda: self.client.fetch_page(query, start, priority=priority),
+                priority
+            )
+        else:
+            search_results = await self.client.fetch_page(query, start)
+        if self.cache is not None and 'items' in search_results:
+            self.cache.put(query, self.engine_id, search_results, start=start, fields=self.fields)
+        return search_results
+
+    async def __collapse_duplicates(self, query, items, priority):
+        # each kept result lists the URLs of the near duplicates collapsed into it
+        index = self.duplicate_filter.index()
+        kept = []
+        with self.instrumentation.stage('query.collapse_duplicates'):
+            self.__add_unique(index, kept, items)
+        next_start = self.client.page_starts(self.number_of_results)[-1] + PAGE_SIZE
+        while self.backfill and len(kept) < self.number_of_results and next_start <= MAX_START:
+            self.instrumentation.count('query.backfill_pages')
+            try:
+                page = await self.__fetch_page(query, next_start, priority)
+            except OfflineCacheMissError:
+                # a session recorded without backfill has no later pages, it is shown as it is
+                break
+            if 'items' not in page:
+                break
+            with self.instrumentation.stage('query.collapse_duplicates'):
+                self.__add_unique(index, kept, self.__parse_results(page['items']))
+            next_start += PAGE_SIZE
+        return kept[:self.number_of_results]
+
+    def __add_unique(self, index, kept, items):
+        for item in items:
+            representative = index.add(len(kept), f"{item['Title']} {item['Summary']}")
+            if representative is None:
+                item['Duplicates'] = []
+                kept.append(item)
+            else:
+                kept[representative]['Duplicates'].append(item['URL'])
+                self.instrumentation.count('query.duplicates')
+
+    @staticmethod
+    def __merge_pages(pages):
+        # a page without items (past the last result) ends the merged list
+        merged = {'items': []}
+        for page in pages:
+            if 'items' not in page:
+                break
+            merged['items'].extend(page['items'])
+        if not merged['items']:
+            return pages[0]
+        return merged
 
     def __verify_results(self, search_results: dict):
 
         # if search results does not contain the items keyword
         if 'items' not in search_results:
-            print("QUERY ERROR: API result does not have items")
-            sys.exit()
+            raise QueryResultsError("API result does not have items")
         
         # if search results does not contain even 10 results irrespective of type i.e., text/html/application/pdf/etc.
         if len(search_results['items']) < self.number_of_results:
-           print("QUERY ERROR: API returned less than 10 results") 
-           sys.exit()
+            raise QueryResultsError(f"API returned less than {self.number_of_results} results")
 
-    def __parse_results(self, search_results):
-        # taking the first 10 results only
-        results = search_results['items'][:self.number_of_results]
+    def __parse_results(self, results):
+        features = self.feature_mapping.items()
         items = []
         for result in results:
             # we decided to not specifically handle non html files since
             # most of application/pdf type files also contained the 3 things needed by us - link, title and snippet
             # we just check for the presence of those 3 keywords and then do the mapping
             # this ensures that we select x out of first 10 results
-            if set(self.feature_mapping.keys()).issubset(set(result.keys())):
-                item = {mapping: result[feature] for feature, mapping in self.feature_mapping.items()}
-                items.append(item)
+            if all(feature in result for feature in self.feature_mapping):
+                items.append({mapping: result[feature] for feature, mapping in features})
             else:
                 continue
         return items
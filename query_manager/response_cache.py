@@ -0,0 +1,97 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    '''
+    SQLite-backed cache of raw Custom Search responses, keyed on the normalized query and
+    the engine id. Entries older than ttl seconds are not served (except offline), but they
+    are only deleted as the least recently used entries beyond max_entries, so that recorded
+    sessions stay available for offline replay.
+
+    mode decides how QueryManager uses the cache:
+    - 'read_through': serve from the cache, query the API on a miss and store the response
+    - 'record': always query the API and store the response
+    - 'offline': only serve from the cache (ignoring the ttl), a miss is an error
+    '''
+    MODES = ('read_through', 'record', 'offline')
+
+    def __init__(self, path, mode='read_through', ttl=7 * 24 * 3600, max_entries=10000, clock=time.time):
+        if mode not in self.MODES:
+            raise ValueError(f"cache mode must be one of {self.MODES}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self.connection.commit()
+
+    def __repr__(self) -> str:
+        return f'ResponseCache(path={self.path}, mode={self.mode}, hits={self.hits}, misses={self.misses})'
+
+    @staticmethod
+    def key(query, engine_id, **params):
+        '''
+        Queries that only differ in case or whitespace share an entry. Extra request
+        parameters (e.g. the result offset) are part of the key
+        '''
+        normalized_query = ' '.join(query.lower().split())
+        extra = '&'.join(f'{name}={params[name]}' for name in sorted(params))
+        return f'{engine_id}\x00{normalized_query}\x00{extra}'
+
+    def get(self, query, engine_id, **params):
+        '''
+        Returns the cached response or None. Counts a hit or a miss
+        '''
+        key = self.key(query, engine_id, **params)
+        now = self.clock()
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT response, created FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (self.mode != 'offline' and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+            self.connection.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, query, engine_id, response, **params):
+        key = self.key(query, engine_id, **params)
+        now = self.clock()
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(response), now, now),
+            )
+            self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        # only by size: an expired entry is still a recording offline mode can replay
+        self.connection.execute(
+            'DELETE FROM responses WHERE key IN '
+            '(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        with self.lock:
+            size = self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'size': size}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,182 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    # optional, decodes several times faster than the json module
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+from instrumentation import NULL_INSTRUMENTATION
+from .exceptions import (
+    QueryConnectionError,
+    QueryHTTPError,
+    QueryParseError,
+    QueryRateLimitError,
+    QueryTimeoutError,
+)
+
+CUSTOM_SEARCH_URL = 'https://www.googleapis.com/customsearch/v1'
+# the API returns at most 10 items per request
+PAGE_SIZE = 10
+# the API serves at most 100 results, so the last page starts at 91
+MAX_START = 91
+# Google APIs only compress responses for user agents that mention gzip
+USER_AGENT = 'feedback-augmented-search (gzip)'
+
+
+class AsyncSearchClient:
+    '''
+    asyncio client for the Custom Search API. Requests go through a keep-alive connection
+    pool (a requests.Session run on a bounded thread pool), with explicit timeouts and
+    bounded retries with jittered exponential backoff on 429 and 5xx responses.
+    base_url can point to a local stub server. With a scheduler (query_scheduler.QueryScheduler),
+    every attempt waits for a token of the shared rate limit and quota before it is sent.
+    fields is a partial response projection (e.g. 'items(link,title,snippet)'), so the API
+    only sends the fields that are used. Responses are gzip compressed on the wire.
+    '''
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, API_KEY, engine_id, base_url=CUSTOM_SEARCH_URL, timeout=(3.05, 10.0),
+                 max_retries=3, backoff=0.5, pool_size=10, sleep=asyncio.sleep, instrumentation=None,
+                 scheduler=None, fields=None):
+        self.API_KEY = API_KEY
+        self.engine_id = engine_id
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.scheduler = scheduler
+        self.fields = fields
+        # bytes received (compressed, and decompressed) and seconds waited, over all requests
+        self.requests = 0
+        self.wire_bytes = 0
+        self.response_bytes = 0
+        self.request_seconds = 0.0
+        self.stats_lock = threading.Lock()
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip', 'User-Agent': USER_AGENT})
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='search-client')
+
+    def __repr__(self) -> str:
+        return f'AsyncSearchClient(base_url={self.base_url}, timeout={self.timeout}, max_retries={self.max_retries})'
+
+    def close(self):
+        self.session.close()
+        self.executor.shutdown(wait=False)
+
+    def params(self, query, start, num):
+        # requests URL-encodes the parameters
+        params = {'key': self.API_KEY, 'cx': self.engine_id, 'q': query, 'start': start, 'num': num}
+        if self.fields is not None:
+            params['fields'] = self.fields
+        return params
+
+    def get(self, params):
+        try:
+            start = time.perf_counter()
+            response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            self.record_response(response, time.perf_counter() - start)
+            return response
+        except requests.exceptions.Timeout as error:
+            raise QueryTimeoutError("Timeout occured") from error
+        except requests.exceptions.TooManyRedirects as error:
+            raise QueryConnectionError("Too many redirects") from error
+        except requests.exceptions.RequestException as error:
+            raise QueryConnectionError("Connection error") from error
+
+    def record_response(self, response, seconds):
+        # the body is already read, tell() is the number of (compressed) bytes read from the socket
+        response_bytes = len(response.content)
+        try:
+            wire_bytes = response.raw.tell() or response_bytes
+        except (AttributeError, OSError):
+            wire_bytes = response_bytes
+        with self.stats_lock:
+            self.requests += 1
+            self.wire_bytes += wire_bytes
+            self.response_bytes += response_bytes
+            self.request_seconds += seconds
+        self.instrumentation.count('query.wire_bytes', wire_bytes)
+        self.instrumentation.count('query.response_bytes', response_bytes)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'requests': self.requests,
+                'wire_bytes': self.wire_bytes,
+                'response_bytes': self.response_bytes,
+                'request_seconds': self.request_seconds,
+            }
+
+    def retry_delay(self, attempt, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        # +-50% jitter around the exponential backoff
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    async def fetch_page(self, query, start=1, num=PAGE_SIZE, priority='interactive'):
+        '''
+        Returns the decoded JSON response of a single page of results. priority orders the
+        request in the scheduler's queue, if there is one
+        '''
+        loop = asyncio.get_running_loop()
+        params = self.params(query, start, num)
+        for attempt in range(self.max_retries + 1):
+            response = None
+            if self.scheduler is not None:
+                await self.scheduler.admit(priority)
+            self.instrumentation.count('query.requests')
+            try:
+                with self.instrumentation.stage('query.network'):
+                    response = await loop.run_in_executor(self.executor, self.get, params)
+            except QueryTimeoutError:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUS_CODES:
+                    with self.instrumentation.stage('query.json_decode'):
+                        return self.decode(response)
+                if attempt == self.max_retries:
+                    self.raise_for_status(response)
+            self.instrumentation.count('query.retries')
+            await self.sleep(self.retry_delay(attempt, response))
+
+    def decode(self, response):
+        if response.status_code >= 400:
+            self.raise_for_status(response)
+        # decoding the bytes directly skips the charset detection of response.json()
+        try:
+            return loads(response.content)
+        except ValueError as error:
+            raise QueryParseError("JSON response can't be parsed") from error
+
+    @staticmethod
+    def raise_for_status(response):
+        try:
+            message = response.json()['error']['message']
+        except (ValueError, KeyError, TypeError):
+            message = response.reason
+        if response.status_code == 429:
+            raise QueryRateLimitError(f"Rate limited by the API: {message}", response.status_code)
+        raise QueryHTTPError(f"HTTP {response.status_code}: {message}", response.status_code)
+
+    @staticmethod
+    def page_starts(number_of_results):
+        '''
+        start offsets (1, 11, 21, ...) of the pages needed for number_of_results
+        '''
+        return list(range(1, number_of_results + 1, PAGE_SIZE))
@@ -0,0 +1,2 @@
+from .scheduler import QueryScheduler, INTERACTIVE, BATCH, PREFETCH, PRIORITIES
+from .token_bucket import TokenBucket
@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from instrumentation import NULL_INSTRUMENTATION
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PREFETCH = 'prefetch'
+# lower is served first
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1, PREFETCH: 2}
+PRIORITY_NAMES = {rank: priority for priority, rank in PRIORITIES.items()}
+# the in-flight request whose fetch is running in the current task, set by coalesce
+CURRENT_REQUEST = contextvars.ContextVar('current_request', default=None)
+
+
+class QueryScheduler:
+    '''
+    Admits API requests through a shared TokenBucket. Requests wait in a priority queue, so
+    interactive sessions are served before batch runs and prefetches, and only the head of
+    the queue takes tokens. Identical requests that are in flight at the same time are
+    coalesced into one. The priority queue is per process; the bucket and quota are shared
+    by every process using the same bucket path.
+
+    Callers may come from different event loops and threads (QueryManager.query runs its own
+    loop, the Prefetcher its own thread), so the queue and the in-flight requests are kept
+    under a threading lock and waiting is done by polling with sleep (injectable for tests).
+    When a request with a higher priority joins an in-flight one, the in-flight request is
+    moved up to that priority. The SQLite transaction of the bucket runs on a thread of its
+    own, so an event loop is never blocked by other processes holding the bucket lock.
+    '''
+    def __init__(self, bucket, poll_interval=0.05, sleep=asyncio.sleep, instrumentation=None):
+        self.bucket = bucket
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        self.lock = threading.Lock()
+        # (priority, sequence number) of every waiting request
+        self.queue = []
+        self.sequence = itertools.count()
+        # request key -> (concurrent.futures.Future, request) of the request being sent, where
+        # request is {'rank': priority, 'ticket': its ticket in the queue while it waits}
+        self.in_flight = {}
+        # only the head of the queue takes tokens, one acquire at a time
+        self.acquiring = False
+        self.bucket_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='token-bucket')
+        self.admitted = Counter()
+        self.coalesced = 0
+        self.promoted = 0
+        self.rejected = 0
+
+    def __repr__(self) -> str:
+        return f'QueryScheduler(bucket={self.bucket}, queued={len(self.queue)}, in_flight={len(self.in_flight)})'
+
+    async def admit(self, priority=INTERACTIVE):
+        '''
+        Waits until the request is at the head of the queue and a token is available.
+        Raises QuotaExceededError when the daily quota is used up
+        '''
+        loop = asyncio.get_running_loop()
+        # a coalesced request can be promoted by its followers, others have a request of their own
+        request = CURRENT_REQUEST.get()
+        if request is None:
+            request = {'rank': PRIORITIES[priority], 'ticket': None}
+        with self.lock:
+            request['rank'] = min(request['rank'], PRIORITIES[priority])
+            request['ticket'] = (request['rank'], next(self.sequence))
+            heapq.heappush(self.queue, request['ticket'])
+        try:
+            with self.instrumentation.stage('scheduler.wait'):
+                while True:
+                    with self.lock:
+                        at_head = self.queue[0] == request['ticket'] and not self.acquiring
+                        if at_head:
+                            self.acquiring = True
+                    if at_head:
+                        try:
+                            delay = await loop.run_in_executor(self.bucket_executor, self.bucket.try_acquire)
+                        finally:
+                            with self.lock:
+                                self.acquiring = False
+                        if delay == 0.0:
+                            with self.lock:
+                                self.remove_ticket(request)
+                                self.admitted[PRIORITY_NAMES[request['ticket'][0]]] += 1
+                                request['ticket'] = None
+                            self.instrumentation.count('scheduler.admitted')
+                            return
+                    else:
+                        delay = self.poll_interval
+                    await self.sleep(min(delay, self.poll_interval))
+        except BaseException:
+            # quota exceeded or cancelled, the ticket leaves the queue
+            with self.lock:
+                self.remove_ticket(request)
+                request['ticket'] = None
+                self.rejected += 1
+            raise
+
+    def remove_ticket(self, request):
+        # called with the lock held
+        if request['ticket'] in self.queue:
+            self.queue.remove(request['ticket'])
+            heapq.heapify(self.queue)
+
+    def promote(self, request, priority):
+        '''
+        Moves an in-flight request (and its ticket, if it is waiting) up to priority. Called
+        with the lock held
+        '''
+        rank = PRIORITIES[priority]
+        if rank >= request['rank']:
+            return
+        request['rank'] = rank
+        self.promoted += 1
+        if request['ticket'] is not None:
+            self.remove_ticket(request)
+            # the ticket keeps its place among the requests of its new priority
+            request['ticket'] = (rank, request['ticket'][1])
+            heapq.heappush(self.queue, request['ticket'])
+
+    async def coalesce(self, key, fetch, priority=INTERACTIVE):
+        '''
+        Returns await fetch(), unless a request with the same key is already in flight, in
+        which case its result is shared and the request is moved up to priority if it is higher
+        '''
+        with self.lock:
+            leader = key not in self.in_flight
+            if leader:
+                future, request = Future(), {'rank': PRIORITIES[priority], 'ticket': None}
+                self.in_flight[key] = (future, request)
+            else:
+                future, request = self.in_flight[key]
+                self.promote(request, priority)
+                self.coalesced += 1
+                self.instrumentation.count('scheduler.coalesced')
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        token = CURRENT_REQUEST.set(request)
+        try:
+            result = await fetch()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            CURRENT_REQUEST.reset(token)
+            with self.lock:
+                del self.in_flight[key]
+
+    def stats(self):
+        quota_used = self.bucket.quota_used()
+        return {
+            'admitted': dict(self.admitted),
+            'coalesced': self.coalesced,
+            'promoted': self.promoted,
+            'rejected': self.rejected,
+            'queued': len(self.queue),
+            'quota_used': quota_used,
+            'quota_remaining': max(self.bucket.daily_quota - quota_used, 0),
+            'daily_quota': self.bucket.daily_quota,
+        }
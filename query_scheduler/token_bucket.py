@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+import time
+
+from query_manager.exceptions import QuotaExceededError
+
+
+class TokenBucket:
+    '''
+    Token bucket of API requests (rate tokens per second, at most capacity) together with a
+    daily quota. The state lives in SQLite, so every process opening the same path shares the
+    same bucket and quota. Each acquire is one IMMEDIATE transaction, which holds the database
+    write lock while the bucket is refilled and a token is taken.
+
+    The Custom Search API quota resets at midnight Pacific time, days are counted in
+    quota_utc_offset (seconds from UTC, standard time).
+    '''
+    def __init__(self, path=':memory:', rate=100 / 60, capacity=10, daily_quota=10000,
+                 quota_utc_offset=-8 * 3600, clock=time.time):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+        self.daily_quota = daily_quota
+        self.quota_utc_offset = quota_utc_offset
+        self.clock = clock
+        self.lock = threading.Lock()
+        # transactions are explicit, other processes wait up to timeout seconds for the lock
+        self.connection = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS bucket (id INTEGER PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+        self.connection.execute('CREATE TABLE IF NOT EXISTS quota (day TEXT PRIMARY KEY, used INTEGER NOT NULL)')
+        self.connection.execute(
+            'INSERT OR IGNORE INTO bucket (id, tokens, updated) VALUES (0, ?, ?)', (float(capacity), clock())
+        )
+
+    def __repr__(self) -> str:
+        return f'TokenBucket(path={self.path}, rate={self.rate}, capacity={self.capacity}, daily_quota={self.daily_quota})'
+
+    def day(self, now):
+        return time.strftime('%Y-%m-%d', time.gmtime(now + self.quota_utc_offset))
+
+    def try_acquire(self):
+        '''
+        Takes a token and counts a request against the daily quota. Returns 0.0 if a token was
+        taken, or else the seconds until the next one. Raises QuotaExceededError when the
+        daily quota is used up
+        '''
+        now = self.clock()
+        day = self.day(now)
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                tokens, updated = self.connection.execute('SELECT tokens, updated FROM bucket WHERE id = 0').fetchone()
+                tokens = min(float(self.capacity), tokens + max(0.0, now - updated) * self.rate)
+                used = self.used_on(day)
+                if used >= self.daily_quota:
+                    raise QuotaExceededError(f"Daily quota of {self.daily_quota} requests used up for {day}")
+
+                if tokens >= 1.0:
+                    tokens -= 1.0
+                    wait = 0.0
+                    self.connection.execute(
+                        'INSERT INTO quota (day, used) VALUES (?, 1) ON CONFLICT(day) DO UPDATE SET used = used + 1',
+                        (day,),
+                    )
+                else:
+                    wait = (1.0 - tokens) / self.rate
+                self.connection.execute('UPDATE bucket SET tokens = ?, updated = ? WHERE id = 0', (tokens, now))
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+        return wait
+
+    def used_on(self, day):
+        row = self.connection.execute('SELECT used FROM quota WHERE day = ?', (day,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def quota_used(self):
+        '''
+        Requests counted against today's quota, by all the processes sharing the bucket
+        '''
+        with self.lock:
+            return self.used_on(self.day(self.clock()))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1 @@
+from .checkpoint import SessionCheckpoint
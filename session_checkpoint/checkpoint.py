@@ -0,0 +1,148 @@
+import glob
+import json
+import os
+
+import numpy
+
+from query_augmenter.document_index import DocumentIndex
+
+
+def encode_strings(strings):
+    '''
+    (offsets, data): the utf-8 bytes of strings concatenated, string i is data[offsets[i]:offsets[i + 1]]
+    '''
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return offsets, numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8)
+
+
+class StringArray:
+    '''
+    Read-only sequence of the strings of encode_strings, decoded when they are read
+    '''
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __repr__(self) -> str:
+        return f'StringArray(strings={len(self)}, bytes={len(self.data)})'
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield data[start:end].decode('utf-8')
+
+
+class SessionCheckpoint:
+    '''
+    Checkpoint of an interactive session in a directory, written after the results of a
+    round are fetched and again after they are judged. It keeps the current query, results
+    and feedback, the drift of k and the session index, so a resumed session needs no API
+    call and no judgment again.
+
+    The index arrays are written as .npy files and loaded as copy-on-write memory maps, so
+    resuming does not read them until they are used. The words and URLs of the index are
+    stored the same way, as utf-8 bytes with their offsets, and only decoded when the index is
+    first used, so restoring takes the same time however long the session was. Every save writes a new generation of
+    arrays and then atomically replaces meta.json, which names the generation; a crash while
+    saving leaves the previous checkpoint intact.
+    '''
+    FORMAT_VERSION = 2
+    META = 'meta.json'
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.mmap = mmap
+        os.makedirs(path, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f'SessionCheckpoint(path={self.path}, mmap={self.mmap})'
+
+    def meta_path(self):
+        return os.path.join(self.path, self.META)
+
+    def array_path(self, name, generation):
+        return os.path.join(self.path, f'{name}.{generation}.npy')
+
+    def exists(self):
+        return os.path.exists(self.meta_path())
+
+    def read_meta(self):
+        with open(self.meta_path(), 'r') as meta_file:
+            return json.load(meta_file)
+
+    def save(self, qa, query, results, feedback, round_number, target_precision):
+        '''
+        feedback is None while the results of the round are being judged
+        '''
+        generation = self.read_meta()['generation'] + 1 if self.exists() else 0
+        meta = {
+            'version': self.FORMAT_VERSION,
+            'generation': generation,
+            'query': query,
+            'results': results,
+            'feedback': feedback,
+            'round': round_number,
+            'target_precision': target_precision,
+            'k': qa.k,
+            'index': None,
+        }
+        if qa.document_index is not None:
+            urls, words, arrays = qa.document_index.to_arrays()
+            arrays['url_offsets'], arrays['url_bytes'] = encode_strings(urls)
+            arrays['word_offsets'], arrays['word_bytes'] = encode_strings(words)
+            for name, array in arrays.items():
+                numpy.save(self.array_path(name, generation), numpy.asarray(array), allow_pickle=False)
+            meta['index'] = {'arrays': sorted(arrays)}
+
+        temporary_path = self.meta_path() + '.tmp'
+        with open(temporary_path, 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(temporary_path, self.meta_path())
+        self.remove_arrays(keep=generation)
+
+    def restore(self, qa):
+        '''
+        Sets the k and session index of qa from the checkpoint, and returns the meta dict
+        (query, results, feedback, round, target_precision)
+        '''
+        meta = self.read_meta()
+        if meta['version'] != self.FORMAT_VERSION:
+            raise ValueError(f"Checkpoint format {meta['version']} is not supported")
+        qa.k = meta['k']
+        if meta['index'] is not None:
+            mmap_mode = 'c' if self.mmap else None
+            arrays = {
+                name: numpy.load(self.array_path(name, meta['generation']), mmap_mode=mmap_mode)
+                for name in meta['index']['arrays']
+            }
+            urls = StringArray(arrays.pop('url_offsets'), arrays.pop('url_bytes'))
+            words = StringArray(arrays.pop('word_offsets'), arrays.pop('word_bytes'))
+            qa.document_index = DocumentIndex.from_arrays(urls, words, arrays)
+        return meta
+
+    def remove_arrays(self, keep=None):
+        for array_path in glob.glob(os.path.join(self.path, '*.npy')):
+            if keep is not None and array_path.endswith(f'.{keep}.npy'):
+                continue
+            try:
+                os.remove(array_path)
+            except OSError:
+                # still memory mapped on some platforms, the next save removes it
+                pass
+
+    def remove(self):
+        '''
+        Deletes the checkpoint, once the session is over
+        '''
+        if self.exists():
+            os.remove(self.meta_path())
+        self.remove_arrays()
@@ -16,7 +16,8 @@ class UIManager:
         print(f"Precision   = {self.target_precision}")
     
     # called when we have to display the results and take feedback from the user
-    def display_and_input_feedback(self, results_dictionary) -> List[int]:
+    # on_feedback, if given, is called with the feedback so far after every judgment
+    def display_and_input_feedback(self, results_dictionary, on_feedback=None) -> List[int]:
         print("\nGoogle Search Results:")
         print("======================")
         user_feedback = []
@@ -27,6 +28,9 @@ class UIManager:
             print(f"URL: {result['URL']}")
             print(f"Title: {result['Title']}")
             print(f"Summary: {result['Summary']}")
+            # near duplicates of this result are not shown, the judgment covers them too
+            if result.get('Duplicates'):
+                print(f"({len(result['Duplicates'])} near-duplicate results hidden)")
             print("]\n")
 
             # we check for lower case input as well, i.e., y/n are also valid inputs
@@ -37,6 +41,8 @@ class UIManager:
                 feedback = input("Relevant (Y/N)?").strip().upper()
 
             user_feedback.append(1 if feedback == 'Y' else 0)
+            if on_feedback is not None:
+                on_feedback(list(user_feedback))
 
         return user_feedback
 